@@ -35,14 +35,23 @@ numpy variables that don't change size can be buffered up to a certain size
 before storing into the directory using log_var(name, var).
 
 """
+import re
 import time
+import json
 import atexit
 import inspect
 import copy
+import queue
+import threading
 from   pathlib     import Path       as pathlib_Path
+from   collections import OrderedDict
 from   sys         import platform   as sys_platform
 from   sys         import argv       as sys_argv
 from   os          import system     as os_system
+from   os          import stat       as os_stat
+from   os          import scandir    as os_scandir
+from   fnmatch     import filter     as fnmatch_filter
+from   fnmatch     import fnmatchcase
 from   tempfile    import gettempdir
 from   dataclasses import dataclass 
 from   typing      import Union
@@ -57,7 +66,9 @@ from   .utils      import (repr_raw,
                            text_to_collection,
                            printv,
                            deepstr,
-                           prepare_for_np_savez)
+                           prepare_for_np_savez,
+                           lazystack,
+                           sort_by_time_tag)
 @dataclass
 class varinlog:
     data_array          : np.ndarray      
@@ -70,6 +81,8 @@ class varinlog:
     plot_start_ago      : float
     plot_win_length     : float
     time_tag            : bool
+    fpath               : pathlib_Path = None
+    n_flushed           : int = 0
 
 @dataclass
 class textinlog:
@@ -79,6 +92,133 @@ class textinlog:
     log_size            : int     
     last_log_flush_time : float
     log_flush_period    : int
+    time_tag            : bool
+    log_max_segments    : int
+    segments            : list
+
+class asyncwriter:
+    """ Background writer
+        Write jobs, i.e. a function and its arguments, are put on a bounded
+        queue and a single daemon thread runs them in the order they arrive.
+        This keeps slow file systems out of the caller's thread.
+
+        :param queue_size:
+            maximum number of jobs waiting to be written.
+        :type queue_size: int
+
+        :param policy:
+            What to do when the queue is full. 'block' waits for the writer
+            to make room (back-pressure), 'drop' discards the job and counts
+            it in n_dropped.
+        :type policy: str
+
+        If a job raises an exception, the last one is kept and raised again
+        by join or close so the caller learns that something was not
+        written. close stops the thread, it is started again by the next put.
+    """
+    def __init__(self, queue_size: int = 1000, policy: str = 'block'):
+        assert policy in ('block', 'drop'), \
+            f'lognflow.asyncwriter: policy must be block or drop, not {policy}'
+        self.policy = policy
+        self.n_dropped = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize = queue_size)
+        self._thread = None
+        self._start()
+
+    def _start(self):
+        if (self._thread is None) or (not self._thread.is_alive()):
+            self._thread = threading.Thread(
+                target = self._run, name = 'lognflow_asyncwriter', 
+                daemon = True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                func, args = job
+                func(*args)
+            except Exception as e:
+                print('lognflow: the background writer could not write.')
+                print(e)
+                self.error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def put(self, func, *args):
+        """ queue func(*args), returns False if the job was dropped """
+        self._start()
+        if self.policy == 'drop':
+            try:
+                self._queue.put_nowait((func, args))
+            except queue.Full:
+                self.n_dropped += 1
+                return False
+        else:
+            self._queue.put((func, args))
+        return True
+
+    def join(self):
+        """ wait until all queued jobs are written """
+        if self._thread.is_alive():
+            self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """ write all queued jobs and stop the thread """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+def _render_worker_init():
+    plt.switch_backend('Agg')
+
+def _render_figure(fpath, plt_func_name, args, kwargs,
+                   image_format = 'jpg', dpi = 1200, title = None):
+    """ draw a figure with a function of plt_utils and save it to fpath
+        This is what the processes of render_workers run. The arguments are
+        the raw arrays and parameters of the plot so it can be pickled.
+    """
+    from . import plt_utils
+    fig = None
+    try:
+        fig, ax = getattr(plt_utils, plt_func_name)(*args, **kwargs)[:2]
+        if title is not None:
+            ax.set_title(title)
+        fig.savefig(fpath, format = image_format, dpi = dpi,
+                    bbox_inches = 'tight')
+    except:
+        try:
+            pathlib_Path(fpath).unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    finally:
+        if fig is not None:
+            plt.close(fig)
+    return fpath
+
+def _load_plot_spec(fpath):
+    import pickle
+    with open(fpath, 'rb') as fdata:
+        return pickle.load(fdata)
+
+def _render_plot_spec(fpath_spec, fpath):
+    """ draw the figure of a .pltspec file that defer_plots saved """
+    spec = _load_plot_spec(fpath_spec)
+    return _render_figure(fpath, spec['plt_func_name'], 
+                          spec['args'], spec['kwargs'],
+                          image_format = spec['image_format'],
+                          dpi = spec['dpi'], title = spec['title'])
 
 save_configs_script = """\
 import numpy as np
@@ -163,6 +303,75 @@ class getLogger:
             '_initial' and then it will make a new one for the next instance and
             update that file onwards.
         :type time_tag: bool
+
+        :param async_write:
+            If True, text flushes and filled record buffers are handed to a
+            background thread that writes them, so the caller does not wait
+            for the file system. flush_all waits for the queue to empty.
+        :type async_write: bool
+
+        :param async_queue_size:
+            maximum number of writes waiting in the queue of async_write.
+        :type async_queue_size: int
+
+        :param async_policy:
+            when the queue of async_write is full, 'block' makes the caller
+            wait and 'drop' discards the write and counts it in
+            logger.async_writer.n_dropped.
+        :type async_policy: str
+
+        :param max_open_files:
+            the files of text logs and the manifest are kept open in append
+            mode between writes. This is the largest number of them that
+            stay open; the least recently written one is closed first. 
+            flush_all closes them all and a file is closed before it is 
+            renamed or removed. Other files, e.g. of save, are opened for 
+            every write. 0 opens and closes the file for every write.
+        :type max_open_files: int
+
+        :param manifest:
+            If True, every file that the logger writes is added to 
+            lognflow_manifest.jsonl in log_dir, one JSON line per file with
+            its name, path, suffix, shape, dtype, size and time. get_flist
+            and load find files from the manifest before searching the 
+            directory. The manifest only knows the files written by 
+            loggers: files added to log_dir by other means are not found 
+            for a name that has files in the manifest, and if a file of 
+            the manifest does not exist anymore, the directory is searched.
+        :type manifest: bool
+
+        :param render_workers:
+            If more than 0, plot, hist, imshow, imshow_subplots and
+            imshow_series do not draw in the caller. The file name is chosen
+            and the arrays and plot parameters are sent to this many worker
+            processes that draw with Agg and save the file. These calls
+            then return a concurrent.futures.Future whose result() is the
+            fpath. At most 4 * render_workers figures wait to be drawn,
+            after that the caller waits. flush_all waits for all of them and
+            shuts the processes down. They are spawned, not forked, since
+            the logger may have a writer thread running, so they import the
+            main script again: the script must log under 
+            if __name__ == '__main__':
+        :type render_workers: int
+
+        :param defer_plots:
+            If True, plot, hist, imshow, imshow_subplots and imshow_series
+            do not draw anything. The arrays and parameters of each call
+            are pickled into a .pltspec file with the name the image would
+            have had. Call render_plots to make the images later, e.g. in
+            parallel. This takes precedence over render_workers. 
+            render_plots with n_workers > 1 spawns its processes, so it 
+            needs if __name__ == '__main__': in the script too.
+        :type defer_plots: bool
+
+        :param reuse_figures:
+            If more than 0, plot, hist and imshow keep the figure they made
+            for each parameter_name and the next call with the same name and
+            the same plot parameters only puts the new data in it, 
+            set_data and set_clim, instead of making a new figure. This is
+            the number of figures kept; the least recently used one is
+            closed first. hist clears and redraws its axes.
+        :type reuse_figures: int
     """
     
     def __init__(self, 
@@ -175,7 +384,19 @@ class getLogger:
                  print_text       : bool             = True,
                  main_log_name    : str              = 'log',
                  log_flush_period : int              = 10,
-                 enabled          : bool             = True):
+                 enabled          : bool             = True,
+                 async_write      : bool             = False,
+                 async_queue_size : int              = 1000,
+                 async_policy     : str              = 'block',
+                 max_open_files   : int              = 32,
+                 manifest         : bool             = False,
+                 render_workers   : int              = 0,
+                 defer_plots      : bool             = False,
+                 reuse_figures    : int              = 0):
+        self.async_writer = None
+        if async_write:
+            self.async_writer = asyncwriter(queue_size = async_queue_size,
+                                            policy = async_policy)
         atexit.register(self.flush_all)
         self._init_time = time.time()
         self.log_dir_prefix = log_dir_prefix
@@ -249,6 +470,21 @@ class getLogger:
         self.close = self.flush_all
         self.warning_log_dir = False
         
+        self.max_open_files = max_open_files
+        self._file_handles = OrderedDict()
+        self._file_handles_lock = threading.Lock()
+        self._dir_index = {}
+        self._flist_cache = {}
+        self._dir_index_lock = threading.Lock()
+        self.manifest = manifest
+        self._manifest_entries = None
+        self.render_workers = render_workers
+        self._render_pool = None
+        self._render_jobs = []
+        self.defer_plots = defer_plots
+        self.reuse_figures = reuse_figures
+        self._figures = OrderedDict()
+
     def setLevel(self, level = 'info.txt'):
         self.log_name = level
         
@@ -422,11 +658,21 @@ class getLogger:
             log_dir_name = new_name        
         new_dir = self.log_dir.parent / log_dir_name
         try:
+            old_dir = self.log_dir
             self.log_dir = self.log_dir.rename(new_dir)
+            with self._dir_index_lock:
+                self._dir_index = {}
+                self._flist_cache = {}
+            rebase = lambda fpath: self.log_dir / fpath.relative_to(old_dir)
             for log_name in list(self._loggers_dict):
                 curr_textinlog = self._loggers_dict[log_name]
-                curr_textinlog.log_fpath = \
-                    self.log_dir /curr_textinlog.log_fpath.name
+                curr_textinlog.log_fpath = rebase(curr_textinlog.log_fpath)
+                curr_textinlog.segments[:] = [
+                    rebase(fpath) for fpath in curr_textinlog.segments]
+            for parameter_name in list(self._vars_dict):
+                curr_var = self._vars_dict[parameter_name]
+                if curr_var.fpath is not None:
+                    curr_var.fpath = rebase(curr_var.fpath)
         except:
             self.text(None, 'Could not rename the log_dir from:')
             self.text(None, f'{self.log_dir.name}')
@@ -593,7 +839,9 @@ class getLogger:
                          log_size_limit: int = int(1e+7),
                          time_tag: bool = None,
                          log_flush_period = None,
-                         suffix = None):
+                         suffix = None,
+                         log_max_segments = None,
+                         segments = None):
         
         if (log_flush_period is None):
             log_flush_period = self.log_flush_period
@@ -606,13 +854,24 @@ class getLogger:
             param_dir, param_name, suffix)
         
         fpath = self._get_fpath(param_dir, param_name, suffix, time_tag)
+        if segments is None:
+            segments = []
+        while fpath in segments:
+            fpath = fpath.parent / \
+                f'{param_name}_{self.time_stamp:.6f}.{suffix}'
+        segments.append(fpath)
+        self._log_artifact(
+            fpath, name = self._get_dirnamesuffix(param_dir, param_name, ''))
         self._loggers_dict[log_dirnamesuffix] = textinlog(
             to_be_logged=[],      
             log_fpath=fpath,         
             log_size_limit=log_size_limit,    
             log_size=0,          
             last_log_flush_time=0,
-            log_flush_period=log_flush_period)  
+            log_flush_period=log_flush_period,
+            time_tag=time_tag,
+            log_max_segments=log_max_segments,
+            segments=segments)  
 
     def text_flush(self, log_name = None, flush = False, suffix = None):
         """ Flush the text logs
@@ -622,6 +881,8 @@ class getLogger:
             called multiple times. but use needs to also call it once in a
             while.
             In later versions, a timer will be used to call it automatically.
+            If the logger was made with async_write, the text is handed to
+            the background writer instead.
             :param flush:
                 force the flush regardless of when the last time was.
                 default: False
@@ -643,12 +904,88 @@ class getLogger:
                                            > curr_textinlog.log_flush_period)
            | flush):
             
-            with open(curr_textinlog.log_fpath, 'a+') as f:
-                f.writelines(curr_textinlog.to_be_logged)
-                f.flush()
+            if not curr_textinlog.to_be_logged:
+                pass
+            elif self.async_writer is None:
+                self._write_text(curr_textinlog.log_fpath,
+                                 curr_textinlog.to_be_logged)
+            else:
+                self.async_writer.put(self._write_text,
+                                      curr_textinlog.log_fpath,
+                                      curr_textinlog.to_be_logged)
             curr_textinlog.to_be_logged = []
             curr_textinlog.last_log_flush_time = self.time_stamp
 
+    def _write_text(self, fpath, lines):
+        if self.max_open_files < 1:
+            with open(fpath, 'a') as f:
+                f.writelines(lines)
+            return
+        with self._file_handles_lock:
+            fpath_str = str(fpath)
+            f = self._file_handles.pop(fpath_str, None)
+            if f is None:
+                while len(self._file_handles) >= self.max_open_files:
+                    _, f_lru = self._file_handles.popitem(last = False)
+                    f_lru.close()
+                f = open(fpath, 'a')
+            self._file_handles[fpath_str] = f
+            f.writelines(lines)
+            f.flush()
+
+    def _close_file_handles(self):
+        with self._file_handles_lock:
+            while self._file_handles:
+                _, f = self._file_handles.popitem()
+                f.close()
+
+    def _close_file_handle(self, fpath):
+        with self._file_handles_lock:
+            f = self._file_handles.pop(str(fpath), None)
+            if f is not None:
+                f.close()
+
+    def _rotate_text(self, log_dirnamesuffix):
+        """ start the next segment of a text log
+            The pending text is flushed into the current segment and a new
+            file is started. Segments always carry a time tag, so if the log
+            was made with time_tag = False, the first file keeps its name
+            and the next ones get one. If log_max_segments is set, the oldest
+            segments made by this logger are deleted. All segment names are
+            kept in segments so that a name is never used twice.
+        """
+        curr_textinlog = self._loggers_dict[log_dirnamesuffix]
+        self.text_flush(log_dirnamesuffix, flush = True)
+        if self.async_writer is not None:
+            self.async_writer.join()
+        self._close_file_handle(curr_textinlog.log_fpath)
+        time_tag = curr_textinlog.time_tag
+        if time_tag == False:
+            time_tag = True
+        self._text_handler(
+            log_dirnamesuffix, 
+            log_size_limit = curr_textinlog.log_size_limit,
+            time_tag = time_tag,
+            log_flush_period = curr_textinlog.log_flush_period,
+            log_max_segments = curr_textinlog.log_max_segments,
+            segments = curr_textinlog.segments)
+        curr_textinlog = self._loggers_dict[log_dirnamesuffix]
+        n_segments = len(curr_textinlog.segments)
+        if (curr_textinlog.log_max_segments and 
+            (n_segments > curr_textinlog.log_max_segments)):
+            old_fpath = curr_textinlog.segments[
+                n_segments - curr_textinlog.log_max_segments - 1]
+            self._close_file_handle(old_fpath)
+            try:
+                try:
+                    old_fpath.unlink()
+                except FileNotFoundError:
+                    pass
+                self._log_artifact_moved(old_fpath, None)
+            except Exception as e:
+                print(f'lognflow: could not remove {old_fpath}: {e}')
+        return curr_textinlog
+
     def text(self, 
                  log_name: str = None,
                  to_be_logged = '', 
@@ -660,7 +997,8 @@ class getLogger:
                  flush = False,
                  end = '\n',
                  new_file = False,
-                 suffix = None):
+                 suffix = None,
+                 log_max_segments = None):
         """ log a string into a text file
             You can shose a name for the log and give the text to put in it.
             Also you can pass a small numpy array. You can ask it to put time
@@ -680,7 +1018,9 @@ class getLogger:
             :param print_text: bool
                    if False, what is logged will not be printed.
             :param log_size_limit: int
-                   log size limit in bytes.
+                   log size limit in bytes. When the text logged into the 
+                   current file adds up to this size, the log continues in
+                   a new file with a time tag in its name.
             :param time_tag: bool
                    put time stamp in file names.
             :param log_flush_period: int
@@ -697,6 +1037,10 @@ class getLogger:
                    it closees the current text file and overwrites on it.
             :param suffix: str
                    suffix is the extension of the file name.
+            :param log_max_segments: int
+                   if given, only this many files of the log are kept and
+                   the oldest ones are removed when a new one is started.
+                   It is set when the log is made, default: None
         """
         if not self.enabled: return
         time_tag = self.time_tag if (time_tag is None) else time_tag
@@ -715,7 +1059,8 @@ class getLogger:
             self._text_handler(log_dirnamesuffix, 
                                log_size_limit = log_size_limit,
                                time_tag = time_tag,
-                               suffix = suffix)
+                               suffix = suffix,
+                               log_max_segments = log_max_segments)
 
         if((print_text is None) | (print_text is True)):
             print_text = self._print_text
@@ -749,13 +1094,8 @@ class getLogger:
         
         self.text_flush(log_dirnamesuffix, flush)        
 
-        if(log_size >= curr_textinlog.log_size_limit):
-            self._text_handler(
-                log_dirnamesuffix, 
-                log_size_limit = curr_textinlog.log_size_limit,
-                time_tag = curr_textinlog.time_tag,
-                suffix = suffix)
-            curr_textinlog = self._loggers_dict[log_dirnamesuffix]
+        if(curr_textinlog.log_size >= curr_textinlog.log_size_limit):
+            curr_textinlog = self._rotate_text(log_dirnamesuffix)
         return curr_textinlog.log_fpath
                         
     def _get_log_counter_limit(self, param, log_size_limit):
@@ -785,6 +1125,9 @@ class getLogger:
                     An np array whose size doesn't change
             :param suffix: str
                     can be 'npz' or 'txt' which will save it as text.
+                    If 'npy', every flush is appended to a single .npy
+                    file for the variable. Its rows have two fields: time and
+                    data. load and get_record read it back memory mapped.
             :param log_size_limit: int
                     log_size_limit in bytes, default: 1e+8.
                     
@@ -818,11 +1161,17 @@ class getLogger:
             curr_index = 0
 
         if(curr_index >= log_counter_limit):
-            self.record_flush(log_dirnamesuffix, **flush_kwargs)
+            self.record_flush(log_dirnamesuffix)
             file_start_time = self.time_stamp
             curr_index = 0
         elif flush:
-            self.record_flush(log_dirnamesuffix, **flush_kwargs)
+            self.record_flush(log_dirnamesuffix)
+        
+        fpath, n_flushed = None, 0
+        if(log_dirnamesuffix in self._vars_dict):
+            fpath = self._vars_dict[log_dirnamesuffix].fpath
+            if(curr_index > 0):
+                n_flushed = self._vars_dict[log_dirnamesuffix].n_flushed
 
         if(curr_index == 0):
             data_array = np.zeros((log_counter_limit, ) + parameter_value.shape,
@@ -846,7 +1195,9 @@ class getLogger:
                                                       savefig,
                                                       plot_start_ago,
                                                       plot_win_length,
-                                                      time_tag)
+                                                      time_tag,
+                                                      fpath,
+                                                      n_flushed)
 
     def record_flush(self, parameter_name: str, suffix: str = None):
         """ Flush the buffered numpy arrays
@@ -874,16 +1225,37 @@ class getLogger:
         _var_data_array = _var.data_array[_var.time_array > 0]
         _var_time_array = _var.time_array[_var.time_array > 0]
         
-        if _var.suffix == 'npz':
-            fpath = _param_dir / f'{param_name}_{_var.file_start_time:.6f}.npz'
-            np.savez(fpath,
-                time_array = _var_time_array,
-                data_array = _var_data_array)
+        if _var.suffix == 'npy':
+            if _var.fpath is None:
+                _var.fpath = self._get_fpath(
+                    param_dir, param_name, 'npy', time_tag)
+                if _var.fpath.is_file():
+                    _var.fpath = self._get_fpath(
+                        param_dir, param_name, 'npy', True)
+            fpath = _var.fpath
+            if self.async_writer is None:
+                self._append_record(fpath,
+                    _var_time_array[_var.n_flushed:],
+                    _var_data_array[_var.n_flushed:])
+            else:
+                self.async_writer.put(self._append_record, fpath,
+                    _var_time_array[_var.n_flushed:],
+                    _var_data_array[_var.n_flushed:])
+            _var.n_flushed = len(_var_time_array)
         else:
-            fpath = _param_dir / f'{param_name}_time_{_var.file_start_time:.6f}.txt'
-            np.savetxt(fpath, _var_time_array)
-            fpath = _param_dir / f'{param_name}_data_{_var.file_start_time:.6f}.txt'
-            np.savetxt(fpath, _var_data_array)
+            if _var.suffix == 'npz':
+                fpath = _param_dir / \
+                    f'{param_name}_{_var.file_start_time:.6f}.npz'
+            else:
+                fpath = _param_dir / \
+                    f'{param_name}_data_{_var.file_start_time:.6f}.txt'
+            if self.async_writer is None:
+                self._write_record(_param_dir, param_name, _var.suffix,
+                    _var.file_start_time, _var_time_array, _var_data_array)
+            else:
+                self.async_writer.put(self._write_record, _param_dir, 
+                    param_name, _var.suffix, _var.file_start_time,
+                    _var_time_array, _var_data_array)
         
         _var_data_array = _var_data_array.squeeze()
         if savefig & (len(_var_data_array.squeeze().shape) == 1):
@@ -919,6 +1291,97 @@ class getLogger:
                         print(f'Cannot plot the average for record {parameter_name}')
         return fpath
     
+    def _write_record(self, param_dir, param_name, suffix, file_start_time,
+                            time_array, data_array):
+        if suffix == 'npz':
+            fpath = param_dir / f'{param_name}_{file_start_time:.6f}.npz'
+            stat_before = self._dir_stat(str(param_dir))
+            np.savez(fpath,
+                time_array = time_array,
+                data_array = data_array)
+            self._index_add(fpath, stat_before)
+            try:
+                name = (param_dir / param_name).relative_to(
+                    self.log_dir).as_posix()
+            except ValueError:
+                name = None
+            self._log_artifact(fpath, data_array, name)
+        else:
+            fpath = param_dir / f'{param_name}_time_{file_start_time:.6f}.txt'
+            stat_before = self._dir_stat(str(param_dir))
+            np.savetxt(fpath, time_array)
+            self._index_add(fpath, stat_before)
+            self._log_artifact(fpath, time_array)
+            fpath = param_dir / f'{param_name}_data_{file_start_time:.6f}.txt'
+            stat_before = self._dir_stat(str(param_dir))
+            np.savetxt(fpath, data_array)
+            self._index_add(fpath, stat_before)
+            self._log_artifact(fpath, data_array)
+
+    def _npy_record_header(self, dtype, n_rows):
+        """ header of an appendable .npy record file
+            The header is padded to the length it would have for the largest
+            number of rows, so patching the shape never moves the data.
+        """
+        header_dict = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }"
+        descr = np.lib.format.dtype_to_descr(dtype)
+        header_len = len(header_dict % (descr, 10**18)) + 1
+        header_len = 64 * int(np.ceil((10 + header_len) / 64)) - 10
+        header = (header_dict % (descr, n_rows)).ljust(header_len - 1) + '\n'
+        return (b'\x93NUMPY\x01\x00' 
+                + np.uint16(header_len).tobytes() + header.encode('latin1'))
+
+    def _append_record(self, fpath, time_array, data_array):
+        """ append rows of a record to its .npy file
+            Each row is a structured element with fields time and data.
+            The rows are written at the end of the file and the number of 
+            rows in the header is updated, so the file is a valid .npy file
+            after every flush.
+        """
+        if len(time_array) == 0:
+            return
+        rows = np.zeros(len(time_array), dtype = [
+            ('time', 'f8'), 
+            ('data', data_array.dtype, data_array.shape[1:])])
+        rows['time'] = time_array
+        rows['data'] = data_array
+        if not fpath.is_file():
+            stat_before = self._dir_stat(str(fpath.parent))
+            with open(fpath, 'wb') as f:
+                f.write(self._npy_record_header(rows.dtype, 0))
+            self._index_add(fpath, stat_before)
+        with open(fpath, 'r+b') as f:
+            np.lib.format.read_magic(f)
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            assert dtype == rows.dtype, \
+                f'lognflow: record in {fpath} has dtype {dtype} but ' \
+                + f'{rows.dtype} is given.'
+            f.seek(0, 2)
+            f.write(rows.tobytes())
+            f.seek(0)
+            f.write(self._npy_record_header(rows.dtype, shape[0] + len(rows)))
+        self._log_artifact(fpath, shape = (shape[0] + len(rows), ),
+                           dtype = rows.dtype, record = True)
+
+    def _is_record_file(self, fpath):
+        """ if fpath is a .npy file made by record
+            These are the records of this logger and, with the manifest,
+            those made by any logger in log_dir.
+        """
+        fpath = pathlib_Path(fpath)
+        for _var in self._vars_dict.values():
+            if (_var.suffix == 'npy') and (_var.fpath == fpath):
+                return True
+        if self.manifest:
+            try:
+                rel_path = fpath.relative_to(self.log_dir).as_posix()
+            except ValueError:
+                return False
+            self.flush_manifest()
+            entry = self.get_manifest().get(rel_path)
+            return (entry is not None) and entry.get('record', False)
+        return False
+
     def get_record(self, parameter_name: str, suffix: str = None) -> tuple:
         """ Get the buffered numpy arrays
             If you need the buffered variable back.
@@ -943,6 +1406,12 @@ class getLogger:
             param_dir, param_name, suffix)
         
         _var = self._vars_dict[log_dirnamesuffix]
+        if _var.suffix == 'npy':
+            self.record_flush(log_dirnamesuffix)
+            if self.async_writer is not None:
+                self.async_writer.join()
+            buf = np.load(_var.fpath)
+            return(buf['time'], buf['data'])
         data_array = _var.data_array[_var.time_array>0].copy()
         time_array = _var.time_array[_var.time_array>0].copy()
         return(time_array, data_array)
@@ -997,6 +1466,7 @@ class getLogger:
             else:
                 suffix = 'txt'
         fpath = self._get_fpath(param_dir, param_name, suffix, time_tag)
+        stat_before = self._dir_stat(str(fpath.parent))
         
         try:
             if(suffix == 'npy'):
@@ -1027,6 +1497,9 @@ class getLogger:
             else:
                 with open(fpath,'a') as fdata: 
                     fdata.write(str(parameter_value))
+            self._index_add(fpath, stat_before)
+            self._log_artifact(fpath, parameter_value, 
+                self._get_dirnamesuffix(param_dir, param_name, ''))
         except Exception as e:
             print(f"lognflow: An error occurred while saving {parameter_name}")
             if verify: raise e
@@ -1148,7 +1621,8 @@ class getLogger:
                 parameter_name: str, 
                 image_format='jpg', dpi=1200,
                 time_tag: bool = None,
-                close_plt = True):
+                close_plt = True,
+                fig = None):
         """log a single plt
             log a plt that you have on the screen.
             
@@ -1158,6 +1632,8 @@ class getLogger:
                     path like name such as myscript/myvar.
             :param time_tag: bool
                     Wheather if the time stamp is in the file name or not.
+            :param fig: matplotlib.figure.Figure
+                    the figure to save, by default the current one.
                     
         """
         if not self.enabled: return
@@ -1168,18 +1644,327 @@ class getLogger:
         fpath = self._get_fpath(param_dir, param_name, image_format, time_tag)
         
         try:
-            plt.savefig(fpath, format=image_format, dpi=dpi,
-                        bbox_inches='tight')
+            if fig is None:
+                plt.savefig(fpath, format=image_format, dpi=dpi,
+                            bbox_inches='tight')
+            else:
+                fig.savefig(fpath, format=image_format, dpi=dpi,
+                            bbox_inches='tight')
             if(close_plt):
-                plt.close()
+                plt.close(fig)
+            self._log_artifact(fpath, 
+                name = self._get_dirnamesuffix(param_dir, param_name, ''))
             return fpath
         except:
             if(close_plt):
-                plt.close()
+                plt.close(fig)
             self.text(
                 None, f'Cannot save the plt instance {parameter_name}.')
             return None
-    
+
+    def _imsave_fast(self, parameter_name, parameter_value, cmap = 'viridis',
+                     colorbar = True, image_format = 'jpg', time_tag = None,
+                     vmin = None, vmax = None):
+        time_tag = self.time_tag if (time_tag is None) else time_tag
+        param_dir, param_name, image_format = \
+            self._param_dir_name_suffix(parameter_name, image_format)
+        fpath = self._get_fpath(param_dir, param_name, image_format, time_tag)
+        stat_before = self._dir_stat(str(fpath.parent))
+        try:
+            from .plt_utils import imsave_fast
+            imsave_fast(fpath, parameter_value, cmap = cmap, 
+                        vmin = vmin, vmax = vmax, colorbar = colorbar,
+                        image_format = image_format)
+            self._index_add(fpath, stat_before)
+            self._log_artifact(fpath, 
+                name = self._get_dirnamesuffix(param_dir, param_name, ''))
+            return fpath
+        except Exception as e:
+            self.text(None, f'Cannot save the image {parameter_name}. {e}')
+            return None
+
+    def _plt_log(self, parameter_name, plt_func_name, args, kwargs,
+                 image_format = 'jpg', dpi = 1200, time_tag = None,
+                 return_figure = False, title = None):
+        """ draw with plt_utils.plt_func_name(*args, **kwargs) and save
+            If defer_plots is set, only the inputs are saved, if 
+            render_workers is set, the drawing is sent to the process
+            pool, unless the figure is asked for or an axis is given.
+        """
+        in_caller = return_figure | (kwargs.get('fig_ax', None) is not None)
+        if self.defer_plots & (not in_caller):
+            return self._save_plot_spec(
+                parameter_name, plt_func_name, args, kwargs,
+                image_format = image_format, dpi = dpi, time_tag = time_tag,
+                title = title)
+        if (self.render_workers > 0) & (not in_caller):
+            return self._submit_render(
+                parameter_name, plt_func_name, args, kwargs,
+                image_format = image_format, dpi = dpi, time_tag = time_tag,
+                title = title)
+        if (self.reuse_figures > 0) & (not in_caller):
+            fig = self._reuse_figure(
+                parameter_name, plt_func_name, args, kwargs, title)
+            return self.savefig(parameter_name = parameter_name,
+                                image_format = image_format, dpi = dpi,
+                                time_tag = time_tag, close_plt = False,
+                                fig = fig)
+        from . import plt_utils
+        fig, ax = getattr(plt_utils, plt_func_name)(*args, **kwargs)[:2]
+        if title is not None:
+            ax.set_title(title)
+        if return_figure:
+            return fig, ax
+        return self.savefig(parameter_name = parameter_name,
+                            image_format = image_format, dpi = dpi,
+                            time_tag = time_tag)
+
+    def _reuse_figure(self, parameter_name, plt_func_name, args, kwargs,
+                      title = None):
+        """ the figure of the last call with the same name, with new data
+            If the plot parameters are different or the data does not fit
+            the artists of the figure, a new figure is made. The figures
+            are closed in pyplot right away so plt.close() elsewhere and
+            the number of open figures are not affected.
+        """
+        key = (parameter_name, plt_func_name)
+        static = (args[1:], {k: v for k, v in kwargs.items() 
+                             if k not in ('x_values_list', 'title',
+                                          'vmin', 'vmax')})
+        entry = self._figures.pop(key, None)
+        fig = None
+        if entry is not None:
+            fig, ax, static_before = entry
+            try:
+                same_static = bool(static == static_before)
+            except:
+                same_static = False
+            try:
+                updated = same_static and self._update_figure(
+                    plt_func_name, fig, ax, args, kwargs, title)
+            except:
+                updated = False
+            if not updated:
+                plt.close(fig)
+                fig = None
+        if fig is None:
+            from . import plt_utils
+            fig, ax = getattr(plt_utils, plt_func_name)(*args, **kwargs)[:2]
+            if title is not None:
+                ax.set_title(title)
+            plt.close(fig)
+        self._figures[key] = (fig, ax, static)
+        while len(self._figures) > self.reuse_figures:
+            self._figures.popitem(last = False)
+        return fig
+
+    def _update_figure(self, plt_func_name, fig, ax, args, kwargs, 
+                       title = None):
+        """ put the data of a plot call into a figure made by the same call
+            returns False if it cannot.
+        """
+        if plt_func_name == 'plt_plot':
+            from .plt_utils import _listify_1d_list
+            y_values_list = _listify_1d_list(args[0])
+            x_values_list = _listify_1d_list(kwargs.get('x_values_list', None))
+            lines = ax.get_lines()
+            if len(lines) != len(y_values_list):
+                return False
+            for list_cnt, (line, y_values) in enumerate(
+                    zip(lines, y_values_list)):
+                if(x_values_list is None):
+                    x_values = np.arange(len(y_values))
+                elif(len(x_values_list) == len(y_values)):
+                    x_values = x_values_list[list_cnt]
+                else:
+                    x_values = x_values_list[0]
+                line.set_data(x_values, y_values)
+            ax.relim()
+            ax.autoscale_view()
+            if kwargs.get('title', None) is not None:
+                ax.set_title(str(kwargs['title']))
+        elif plt_func_name == 'plt_imshow':
+            img = np.asarray(args[0])
+            if np.iscomplexobj(img) | kwargs.get('show_values', False):
+                return False
+            if (not hasattr(ax, 'images')) or (len(ax.images) != 1):
+                return False
+            im = ax.images[0]
+            if im.get_array().shape != img.shape:
+                return False
+            im.set_data(img)
+            if img.ndim == 2:
+                vmin = kwargs.get('vmin', None)
+                vmax = kwargs.get('vmax', None)
+                im.set_clim(np.nanmin(img) if vmin is None else vmin,
+                            np.nanmax(img) if vmax is None else vmax)
+            suptitle = getattr(fig, '_suptitle', None)
+            title_ = kwargs.get('title', None)
+            if (title_ is None) != (suptitle is None):
+                return False
+            if title_ is not None:
+                suptitle.set_text(str(title_))
+        elif plt_func_name == 'plt_hist':
+            from .plt_utils import plt_hist
+            ax.cla()
+            plt_hist(*args, fig_ax = (fig, ax), **kwargs)
+        else:
+            return False
+        if title is not None:
+            ax.set_title(title)
+        return True
+
+    def _save_plot_spec(self, parameter_name, plt_func_name, args, kwargs,
+                        image_format = 'jpg', dpi = 1200, time_tag = None,
+                        title = None):
+        import pickle
+        time_tag = self.time_tag if (time_tag is None) else time_tag
+        param_dir, param_name, image_format = \
+            self._param_dir_name_suffix(parameter_name, image_format)
+        fpath = self._get_fpath(param_dir, param_name, 'pltspec', time_tag)
+        stat_before = self._dir_stat(str(fpath.parent))
+        name = self._get_dirnamesuffix(param_dir, param_name, '')
+        spec = dict(name = name,
+                    plt_func_name = plt_func_name,
+                    args = args,
+                    kwargs = kwargs,
+                    image_format = image_format,
+                    dpi = dpi,
+                    title = title)
+        try:
+            with open(fpath, 'wb') as fdata:
+                pickle.dump(spec, fdata, protocol = pickle.HIGHEST_PROTOCOL)
+            self._index_add(fpath, stat_before)
+            self._log_artifact(fpath, name = name)
+            return fpath
+        except Exception as e:
+            try:
+                fpath.unlink()
+            except FileNotFoundError:
+                pass
+            self.text(None, 
+                f'Cannot save the plot inputs of {parameter_name}. {e}')
+            return None
+
+    def render_plots(self, var_name = '**/*', n_workers = 1, 
+                     remove_specs = False, overwrite = False):
+        """ draw the figures that defer_plots saved
+            Every .pltspec file that matches var_name is drawn into an image
+            next to it with the same name, the image_format and dpi given
+            to the plot call. The .pltspec files are pickles, so only
+            render the log directories you trust; load and get_stack do not
+            open them. With n_workers > 1 the processes are spawned, not 
+            forked, so they import the main script again and it must call
+            render_plots under if __name__ == '__main__':
+            
+            :param var_name: str
+                    a name or a pattern, e.g. 'loss' or 'imgs/img*', 
+                    .pltspec is added if not given. By default all of them.
+            :param n_workers: int
+                    number of processes that draw the figures.
+            :param remove_specs: bool
+                    if True, the .pltspec file is removed after its image 
+                    is made.
+            :param overwrite: bool
+                    if False, the specs whose image exists are skipped.
+            :return: list of paths of the images
+        """
+        if not var_name.endswith('.pltspec'):
+            var_name += '.pltspec'
+        flist = self.get_flist(var_name)
+        jobs = []
+        for fpath_spec in flist:
+            if fpath_spec.suffix != '.pltspec':
+                continue
+            try:
+                spec = _load_plot_spec(fpath_spec)
+            except Exception as e:
+                self.text(None, f'Cannot read {fpath_spec}. {e}')
+                continue
+            fpath = fpath_spec.with_suffix('.' + spec['image_format'])
+            if overwrite | (not fpath.is_file()):
+                jobs.append((fpath_spec, fpath, spec['name']))
+
+        def _done(job, fpath):
+            if remove_specs:
+                job[0].unlink()
+                self._log_artifact_moved(job[0], None)
+            self._log_artifact(fpath, name = job[2])
+            return fpath
+
+        fpaths = []
+        if n_workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            from multiprocessing import get_context
+            # forking while the writer thread holds a lock can deadlock
+            with ProcessPoolExecutor(max_workers = n_workers,
+                                     mp_context = get_context('spawn'),
+                                     initializer = _render_worker_init) as pool:
+                futures = [pool.submit(_render_plot_spec, *_[:2]) 
+                           for _ in jobs]
+                for future, job in zip(futures, jobs):
+                    try:
+                        fpaths.append(_done(job, future.result()))
+                    except Exception as e:
+                        self.text(None, f'Cannot render {job[0]}. {e}')
+        else:
+            for job in jobs:
+                try:
+                    fpaths.append(_done(job, _render_plot_spec(*job[:2])))
+                except Exception as e:
+                    self.text(None, f'Cannot render {job[0]}. {e}')
+        return fpaths
+
+    def _submit_render(self, parameter_name, plt_func_name, args, kwargs,
+                       image_format = 'jpg', dpi = 1200, time_tag = None,
+                       title = None):
+        time_tag = self.time_tag if (time_tag is None) else time_tag
+        param_dir, param_name, image_format = \
+            self._param_dir_name_suffix(parameter_name, image_format)
+        fpath = self._get_fpath(param_dir, param_name, image_format, time_tag)
+        # the empty file holds the name until the worker overwrites it
+        fpath.touch()
+
+        if self._render_pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            from multiprocessing import get_context
+            # forking while the writer thread holds a lock can deadlock
+            self._render_pool = ProcessPoolExecutor(
+                max_workers = self.render_workers,
+                mp_context = get_context('spawn'),
+                initializer = _render_worker_init)
+        self._collect_renders(max_pending = 4 * self.render_workers - 1)
+        future = self._render_pool.submit(
+            _render_figure, fpath, plt_func_name, args, kwargs,
+            image_format = image_format, dpi = dpi, title = title)
+        self._render_jobs.append(
+            (future, parameter_name,
+             self._get_dirnamesuffix(param_dir, param_name, '')))
+        return future
+
+    def _collect_renders(self, max_pending = 0):
+        """ wait until at most max_pending figures are being drawn and
+            log the ones that are done
+        """
+        if not self._render_jobs: return
+        from concurrent.futures import wait, FIRST_COMPLETED
+        while True:
+            pending = []
+            for job in self._render_jobs:
+                future, parameter_name, name = job
+                if not future.done():
+                    pending.append(job)
+                elif future.exception() is None:
+                    self._log_artifact(future.result(), name = name)
+                else:
+                    self.text(None,
+                        f'Cannot save the plt instance {parameter_name}.'
+                        f' {future.exception()}')
+            self._render_jobs = pending
+            if len(pending) <= max_pending:
+                break
+            wait([_[0] for _ in pending], return_when = FIRST_COMPLETED)
+
     def plot(self, parameter_name: str, 
                    parameter_value_list,
                    *plt_plot_args,
@@ -1214,20 +1999,13 @@ class getLogger:
         """
         if not self.enabled: return
         time_tag = self.time_tag if (time_tag is None) else time_tag
-        from .plt_utils import plt_plot
-        plt_plot(
-            parameter_value_list, *plt_plot_args, 
-            x_values_list = x_values_list, fig_ax = fig_ax, 
-            title = title, labels = labels, **kwargs)
-            
-        if not return_figure:
-            fpath = self.savefig(
-                parameter_name = parameter_name, 
-                image_format=image_format, dpi=dpi,
-                time_tag = time_tag)
-            return fpath
-        else:
-            return fig, ax
+        return self._plt_log(
+            parameter_name, 'plt_plot', 
+            (parameter_value_list, *plt_plot_args),
+            dict(x_values_list = x_values_list, fig_ax = fig_ax, 
+                 title = title, labels = labels, **kwargs),
+            image_format = image_format, dpi = dpi, time_tag = time_tag,
+            return_figure = return_figure)
     
     def printv(self, var, **kwargs):
         import inspect
@@ -1293,21 +2071,12 @@ class getLogger:
         if not self.enabled: return
         time_tag = self.time_tag if (time_tag is None) else time_tag
             
-        from .plt_utils import plt_hist
-        fig, ax = plt_hist(parameter_value_list, 
-                           bins = bins, alpha = alpha, 
-                           normalize = normalize, 
-                           labels_list = labels_list, **kwargs)
-        if title is not None:
-            ax.set_title(title)
-        if not return_figure:
-            fpath = self.savefig(
-                parameter_name = parameter_name, 
-                image_format=image_format, dpi=dpi,
-                time_tag = time_tag)
-            return fpath
-        else:
-            return fig, ax
+        return self._plt_log(
+            parameter_name, 'plt_hist', (parameter_value_list,),
+            dict(bins = bins, alpha = alpha, normalize = normalize, 
+                 labels_list = labels_list, **kwargs),
+            image_format = image_format, dpi = dpi, time_tag = time_tag,
+            return_figure = return_figure, title = title)
     
     
     def scatter3(self, parameter_name: str,
@@ -1445,7 +2214,8 @@ class getLogger:
                    remove_axis_ticks = True,
                    image_format='jpg', dpi=1200, cmap = 'viridis',
                    title = None, time_tag: bool = None, borders = 0, 
-                   return_figure = False, figsize = None, **kwargs):
+                   return_figure = False, figsize = None, fast = False,
+                   **kwargs):
         """log an image
             The image is logged using plt.imshow
             Accepted shapes are:
@@ -1468,6 +2238,12 @@ class getLogger:
                     * (n_im, n_r, n_c, 3)
             :param time_tag: bool
                     Wheather if the time stamp is in the file name or not.
+            :param fast: bool
+                    If True, real images are not drawn by matplotlib. The
+                    colormap is applied with numpy and the image is saved
+                    by PIL at its own size, with a color strip and its
+                    vmin and vmax if colorbar is True. Only vmin and vmax
+                    are used from kwargs. title, figsize and dpi are ignored.
         """
         if not self.enabled: return
         time_tag = self.time_tag if (time_tag is None) else time_tag
@@ -1496,24 +2272,25 @@ class getLogger:
             if parameter_value is not None:
                 FLAG_img_ready = True
 
+        if FLAG_img_ready & fast & (not return_figure) & \
+                (not np.iscomplexobj(parameter_value)):
+            return self._imsave_fast(
+                parameter_name, parameter_value, cmap = cmap, 
+                colorbar = colorbar, image_format = image_format, 
+                time_tag = time_tag, vmin = kwargs.get('vmin', None),
+                vmax = kwargs.get('vmax', None))
+
         if(FLAG_img_ready):
-            from .plt_utils import plt_imshow
-            plt_imshow(parameter_value, 
-                       colorbar = colorbar, 
-                       remove_axis_ticks = remove_axis_ticks, 
-                       title = title,
-                       cmap = cmap,
-                       figsize = figsize,
-                       **kwargs)
-                
-            if not return_figure:
-                fpath = self.savefig(
-                        parameter_name = parameter_name, 
-                        image_format=image_format, dpi=dpi,
-                        time_tag = time_tag)
-                return fpath
-            else:
-                return fig, ax
+            return self._plt_log(
+                parameter_name, 'plt_imshow', (parameter_value,),
+                dict(colorbar = colorbar, 
+                     remove_axis_ticks = remove_axis_ticks, 
+                     title = title,
+                     cmap = cmap,
+                     figsize = figsize,
+                     **kwargs),
+                image_format = image_format, dpi = dpi, time_tag = time_tag,
+                return_figure = return_figure)
         else:
             self.text(
                 self.log_name,
@@ -1567,25 +2344,19 @@ class getLogger:
         if not self.enabled: return
         time_tag = self.time_tag if (time_tag is None) else time_tag
 
-        from .plt_utils import plt_imshow_subplots
-        fig, ax = plt_imshow_subplots(images = images,
-                                     frame_shape = frame_shape, 
-                                     grid_locations = grid_locations,
-                                     figsize = figsize,
-                                     colorbar = colorbar,
-                                     remove_axis_ticks = remove_axis_ticks,
-                                     titles = titles,
-                                     cmaps = cmaps,
-                                     **kwargs)
-                
-        if not return_figure:
-            fpath = self.savefig(
-                    parameter_name = parameter_name, 
-                    image_format=image_format, dpi=dpi,
-                    time_tag = time_tag)
-            return fpath
-        else:
-            return fig, ax
+        return self._plt_log(
+            parameter_name, 'plt_imshow_subplots', (),
+            dict(images = images,
+                 frame_shape = frame_shape, 
+                 grid_locations = grid_locations,
+                 figsize = figsize,
+                 colorbar = colorbar,
+                 remove_axis_ticks = remove_axis_ticks,
+                 titles = titles,
+                 cmaps = cmaps,
+                 **kwargs),
+            image_format = image_format, dpi = dpi, time_tag = time_tag,
+            return_figure = return_figure)
     
     def imshow_series(self, 
                       parameter_name: str,
@@ -1715,8 +2486,9 @@ class getLogger:
         if not self.enabled: return
         time_tag = self.time_tag if (time_tag is None) else time_tag
         
-        from .plt_utils import plt_imshow_series
-        fig, ax = plt_imshow_series(
+        return self._plt_log(
+            parameter_name, 'plt_imshow_series', (),
+            dict(
             list_of_stacks          = list_of_stacks, 
             list_of_masks           = list_of_masks,
             figsize                 = figsize,
@@ -1736,16 +2508,9 @@ class getLogger:
             grid_width_space        = grid_width_space,
             remove_axis_ticks       = remove_axis_ticks,
             aspect                  = aspect,
-            **kwargs)
-            
-        if not return_figure:
-            fpath = self.savefig(
-                    parameter_name = parameter_name, 
-                    image_format=image_format, dpi=dpi,
-                    time_tag = time_tag)
-            return fpath
-        else:
-            return fig, ax
+            **kwargs),
+            image_format = image_format, dpi = dpi, time_tag = time_tag,
+            return_figure = return_figure)
 
     def images_to_pdf(self,
         parameter_name: str, 
@@ -1753,7 +2518,19 @@ class getLogger:
         time_tag: bool = None,
         dpi=1200, 
         **kwargs):
-        
+        """ put images into a PDF file, one image per page
+            The pages are written one at a time by pdfwriter, so 
+            parameter_value can be a generator or a lazystack and the 
+            memory does not grow with the number of pages.
+            
+            :param parameter_value:
+                anything that gives uint8 2D or RGB images, PIL images or
+                paths of image files when iterated.
+            :param dpi:
+                resolution of the pages
+            :param kwargs:
+                quality of the JPEG pages, title, author, etc.
+        """
         if not self.enabled: return
         time_tag = self.time_tag if (time_tag is None) else time_tag
             
@@ -1766,13 +2543,10 @@ class getLogger:
         except Exception as e:
             print('install PIL by: --> pip install Pillow')
             raise e
-        images = [Image.fromarray(_) for _ in parameter_value]
-        images[0].save(
-            fpath, "PDF" , 
-            resolution=dpi, 
-            save_all=True, 
-            append_images=images[1:],
-            **kwargs)
+        from .plt_utils import save_pdf
+        save_pdf(fpath, parameter_value, dpi = dpi, **kwargs)
+        self._log_artifact(fpath, 
+            name = self._get_dirnamesuffix(param_dir, param_name, ''))
         
     def variables_to_pdf(self,
                          parameter_name: str, 
@@ -1780,9 +2554,27 @@ class getLogger:
                          time_tag: bool = None,
                          dpi = 1200,
                          **kwargs):
-        images = self.get_stack_from_names(parameter_value)
+        """ put all files of a list of variable names into a PDF file
+            The names are listed first, then the files are read one at a
+            time while the pages are written. JPEG and PNG files are given
+            to the PDF writer by their path, JPEGs are copied into the PDF
+            without decoding them.
+        """
+        if isinstance(parameter_value, str):
+            parameter_value = [parameter_value]
+        names_flists = [(name, self.get_flist(name)) 
+                        for name in parameter_value]
+        def _frames():
+            for name, flist in names_flists:
+                for file_index, fpath in enumerate(flist):
+                    if fpath.suffix.lower() in ('.jpg', '.jpeg', '.png'):
+                        yield fpath
+                        continue
+                    data = self.load(name, file_index = file_index)
+                    if data is not None:
+                        yield data
         self.images_to_pdf(
-            parameter_name, images, time_tag, dpi, **kwargs)
+            parameter_name, _frames(), time_tag, dpi, **kwargs)
 
     def log_confusion_matrix(self,
                              parameter_name: str,
@@ -1848,9 +2640,15 @@ class getLogger:
 
     def log_animation(
         self, parameter_name: str, stack, interval=50, blit=False, 
-        repeat_delay = None, dpi=100, time_tag: bool = None):
+        repeat_delay = None, dpi=100, time_tag: bool = None,
+        cmap = 'viridis', vmin = None, vmax = None, zoom = None,
+        image_format = 'gif'):
         
         """Make an animation from a stack of images
+            The frames are colormapped with numpy and written to the file
+            one at a time, so the memory does not grow with the number of
+            frames. By default they are about as large as plt.imshow 
+            would show them on a figure saved with dpi.
             
             :param parameter_name: str
                     examples: myvar or myscript/myvar
@@ -1858,34 +2656,44 @@ class getLogger:
                     path like name such as myscript/myvar.
             :param stack: np.array of shape 
                     n_f x n_r x n_c or n_f x n_r x n_c x 3
-                    stack[cnt] needs to be plotable by plt.imshow()
+                    or anything that gives such frames when iterated, e.g.
+                    a generator, a memory mapped array or a lazystack.
+            :param interval: int
+                    time between frames in milliseconds.
+            :param vmin, vmax: float
+                    range of the colormap for all frames, by default 
+                    every frame uses its own range.
+            :param zoom: int
+                    every pixel is shown by zoom x zoom pixels. If None, 
+                    it is chosen from dpi.
+            :param dpi: int
+                    used to choose zoom if it is not given.
+            :param image_format: str
+                    gif, or mp4 if ffmpeg is available.
             :param time_tag: bool
                     Wheather if the time stamp is in the file name or not.
+            
+            blit is not used anymore.
         """
         if not self.enabled: return
+        if blit:
+            print('lognflow: log_animation does not use blit anymore, '
+                  'it is ignored.')
         time_tag = self.time_tag if (time_tag is None) else time_tag
             
         param_dir, param_name, suffix = self._param_dir_name_suffix(
-            parameter_name, 'gif')
+            parameter_name, image_format)
         fpath = self._get_fpath(param_dir, param_name, suffix, time_tag)
 
-        fig, ax = plt.subplots()
-        ims = []
-        for img in stack:    
-            im = ax.imshow(img, animated=True)
-            ax.axis('off')
-            ims.append([im])
-
-        from matplotlib import animation as matplotlib_animation
-        ani = matplotlib_animation.ArtistAnimation(\
-            fig, ims, interval = interval, blit = blit, repeat_delay = repeat_delay)
+        from .plt_utils import save_animation
         try:
-            ani.save(fpath, dpi = dpi, 
-                 writer = matplotlib_animation.PillowWriter(fps=int(1000/interval)))
-            plt.close()
+            save_animation(fpath, stack, interval = interval, cmap = cmap,
+                           vmin = vmin, vmax = vmax, zoom = zoom,
+                           repeat_delay = repeat_delay, dpi = dpi)
+            self._log_artifact(fpath, 
+                name = self._get_dirnamesuffix(param_dir, param_name, ''))
             return fpath
         except Exception as e:
-            plt.close()
             print('lognflow: cannot save the animation. Here is the unraised error:')
             print(e)
             print('-'*79)
@@ -1896,6 +2704,15 @@ class getLogger:
             self.text_flush(log_name, flush = True)
         for parameter_name in list(self._vars_dict):
             self.record_flush(parameter_name)
+        self._collect_renders()
+        if self._render_pool is not None:
+            self._render_pool.shutdown(wait = True)
+            self._render_pool = None
+        try:
+            if self.async_writer is not None:
+                self.async_writer.close()
+        finally:
+            self._close_file_handles()
 
     def savez(self, parameter_name: str, 
                     parameter_value,
@@ -1969,7 +2786,21 @@ class getLogger:
         var_name = var_name.replace('\t', '\\t').replace('\n', '\\n')\
             .replace('\r', '\\r').replace('\b', '\\b')
 
-        flist = list((self.log_dir).glob(var_name))
+        if self.manifest:
+            flist = self._get_flist_manifest(var_name, suffix)
+            if flist and all([fpath.is_file() for fpath in flist]):
+                return self._expand_segments(var_name, flist)
+
+        cache_key = (var_name, suffix)
+        with self._dir_index_lock:
+            cached = self._flist_cache.get(cache_key)
+        if cached is not None:
+            if all([self._dir_stat(dir_key) == dir_stat 
+                    for dir_key, dir_stat in cached[0]]):
+                return list(cached[1])
+        deps = []
+
+        flist = self._glob_indexed(var_name, deps)
         
         if not flist:
             if suffix is None:
@@ -1987,29 +2818,327 @@ class getLogger:
             suffix = suffix.strip('.')        
     
             flist = []            
-            if((self.log_dir / var_name).is_file()):
+            if(self._is_file_indexed(var_name, deps)):
                 flist = [self.log_dir / var_name]
-            elif((self.log_dir / f'{var_name}.{suffix}').is_file()):
+            elif(self._is_file_indexed(f'{var_name}.{suffix}', deps)):
                 flist = [self.log_dir / f'{var_name}.{suffix}']
             else:
-                _var_name = (self.log_dir / var_name).name
-                _var_dir = (self.log_dir / var_name).parent
-                search_patt = f'{_var_name}.{suffix}'
+                search_patt = f'{var_name}.{suffix}'
+                _var_dir, _, search_patt = search_patt.rpartition('/')
                 search_patt = replace_all(search_patt, '**', '*')
-                flist = list(_var_dir.glob(search_patt))
+                if _var_dir:
+                    search_patt = _var_dir + '/' + search_patt
+                flist = self._glob_indexed(search_patt, deps)
         if(flist):
-            try:
-                flist_tags = np.array([float(fpath_v.stem.split('_')[-1]) for fpath_v in flist])
-                sortinds = np.argsort(flist_tags)
-                flist = [flist[_] for _ in sortinds]
-            except:
-                flist.sort()
+            flist = sort_by_time_tag(flist)
         else:
-            var_dir = self.log_dir / var_name
-            if(var_dir.is_dir()):
-                flist = list(var_dir.glob('*'))
+            if(self._is_dir_indexed(var_name, deps)):
+                flist = self._glob_indexed(var_name + '/*', deps)
             if(len(flist) > 0):
                 flist.sort()
+        flist = self._expand_segments(var_name, flist)
+        
+        if not (None in deps):
+            with self._dir_index_lock:
+                if len(self._flist_cache) > 10000:
+                    self._flist_cache = {}
+                self._flist_cache[cache_key] = (deps, list(flist))
+        return flist
+
+    def _dir_stat(self, dir_key):
+        """ what tells if a directory has changed: its modification time, 
+            size and number of links, or None if it cannot be read.
+        """
+        try:
+            dir_stat = os_stat(dir_key)
+            return (dir_stat.st_mtime_ns, dir_stat.st_size, 
+                    dir_stat.st_nlink)
+        except OSError:
+            return None
+
+    def _list_dir(self, dir_path, deps):
+        """ names in a directory from the directory index
+            The index keeps the listing of every directory that was searched
+            with the stat of the directory, see _dir_stat. The listing is 
+            made again only if the stat of the directory has changed. Only 
+            the stats of the directory are compared, not the clock of this
+            machine, which may differ from that of a network file system.
+            Returns a dictionary of names to whether they are directories.
+            The directory and its stat are added to deps.
+        """
+        dir_key = str(dir_path)
+        dir_stat = self._dir_stat(dir_key)
+        if dir_stat is None:
+            deps.append((dir_key, None))
+            return {}
+        with self._dir_index_lock:
+            entry = self._dir_index.get(dir_key)
+        if (entry is None) or (entry[0] != dir_stat):
+            names = {}
+            try:
+                with os_scandir(dir_key) as dir_entries:
+                    for dir_entry in dir_entries:
+                        names[dir_entry.name] = dir_entry.is_dir()
+            except OSError:
+                deps.append((dir_key, None))
+                return {}
+            entry = (dir_stat, names)
+            with self._dir_index_lock:
+                self._dir_index[dir_key] = entry
+        deps.append((dir_key, entry[0]))
+        return entry[1]
+
+    def _split_indexed(self, var_name):
+        """ directory and name of a pattern if the index can be used
+            The index only knows about the files in a directory, so if the
+            directory part of the pattern has wildcards or there is a **,
+            None is returned and pathlib glob is used.
+        """
+        var_dir, _, var_fname = var_name.rpartition('/')
+        if ((not var_fname) or ('**' in var_fname) or 
+            any([_ in var_dir for _ in '*?['])):
+            return None
+        return (self.log_dir / var_dir if var_dir else self.log_dir), var_fname
+
+    def _glob_indexed(self, var_name, deps):
+        split = self._split_indexed(var_name)
+        if split is None:
+            deps.append(None)
+            return list(self.log_dir.glob(var_name))
+        var_dir, var_fname = split
+        names = self._list_dir(var_dir, deps)
+        if any([_ in var_fname for _ in '*?[']):
+            with self._dir_index_lock:
+                fnames = fnmatch_filter(names, var_fname)
+            return [var_dir / fname for fname in fnames]
+        if var_fname in names:
+            return [var_dir / var_fname]
+        return []
+
+    def _is_file_indexed(self, var_name, deps):
+        split = self._split_indexed(var_name)
+        if split is None:
+            deps.append(None)
+            return (self.log_dir / var_name).is_file()
+        var_dir, var_fname = split
+        return self._list_dir(var_dir, deps).get(var_fname) == False
+
+    def _is_dir_indexed(self, var_name, deps):
+        split = self._split_indexed(var_name)
+        if split is None:
+            deps.append(None)
+            return (self.log_dir / var_name).is_dir()
+        var_dir, var_fname = split
+        return self._list_dir(var_dir, deps).get(var_fname) == True
+
+    def _index_add(self, fpath, stat_before):
+        """ add a file that the logger wrote to the directory index
+            so that the directory does not need to be listed again.
+            stat_before is the stat of the directory before the file was 
+            written. If the index was not up to date with it, something 
+            else has changed the directory and it will be listed again. 
+            With async_write, files are made by two threads, so the index
+            only relies on the stats of the directories.
+        """
+        if self.async_writer is not None:
+            return
+        dir_key = str(fpath.parent)
+        with self._dir_index_lock:
+            entry = self._dir_index.get(dir_key)
+            if (entry is None) or (entry[0] != stat_before):
+                return
+            dir_stat = self._dir_stat(dir_key)
+            if dir_stat is None:
+                self._dir_index.pop(dir_key)
+            else:
+                entry[1][fpath.name] = False
+                self._dir_index[dir_key] = (dir_stat, entry[1])
+
+    @property
+    def manifest_fpath(self):
+        return self.log_dir / 'lognflow_manifest.jsonl'
+
+    def _log_artifact(self, fpath, value = None, name = None, 
+                      shape = None, dtype = None, record = False):
+        """ add a file that the logger wrote to the manifest
+            Every writer calls this with the path and, if it has it, 
+            the value that was written, so its shape and dtype are kept.
+            shape and dtype can be given instead of the value. record marks
+            a .npy file made by record.
+        """
+        if not self.manifest: return
+        try:
+            fpath = pathlib_Path(fpath)
+            try:
+                rel_path = fpath.relative_to(self.log_dir).as_posix()
+            except ValueError:
+                rel_path = pathlib_Path(
+                    self.name_from_file(fpath)).as_posix()
+            if name is None:
+                name = rel_path[:-len(fpath.suffix)] if fpath.suffix \
+                    else rel_path
+            entry = dict(name = name,
+                         path = rel_path,
+                         suffix = fpath.suffix.strip('.'),
+                         shape = None,
+                         dtype = None,
+                         size = None,
+                         time = time.time())
+            if hasattr(value, 'shape') & hasattr(value, 'dtype'):
+                shape, dtype = value.shape, value.dtype
+            if shape is not None:
+                entry['shape'] = [int(_) for _ in shape]
+            if dtype is not None:
+                entry['dtype'] = str(dtype)
+            if record:
+                entry['record'] = True
+            try:
+                entry['size'] = fpath.stat().st_size
+            except OSError: pass
+            self._write_manifest(entry)
+        except Exception as e:
+            print(f'lognflow: could not add {fpath} to the manifest: {e}')
+
+    def _log_artifact_moved(self, fpath, fpath_new):
+        """ tell the manifest a file was renamed, or removed if
+            fpath_new is None
+        """
+        if not self.manifest: return
+        try:
+            entry = dict(path = fpath.relative_to(self.log_dir).as_posix(),
+                         time = time.time())
+            if fpath_new is None:
+                entry['removed'] = True
+            else:
+                entry['moved_to'] = \
+                    fpath_new.relative_to(self.log_dir).as_posix()
+            self._write_manifest(entry)
+        except Exception as e:
+            print(f'lognflow: could not update the manifest for {fpath}: {e}')
+
+    def _write_manifest(self, entry):
+        self._write_text(self.manifest_fpath, [json.dumps(entry) + '\n'])
+        with self._dir_index_lock:
+            if self._manifest_entries is not None:
+                self._apply_manifest_entry(self._manifest_entries, entry)
+
+    def _apply_manifest_entry(self, entries, entry):
+        if entry.get('removed', False):
+            entries.pop(entry['path'], None)
+        elif 'moved_to' in entry:
+            moved = entries.pop(entry['path'], None)
+            if moved is not None:
+                moved = dict(moved)
+                moved['path'] = entry['moved_to']
+                entries[moved['path']] = moved
+        else:
+            prev_entry = entries.get(entry['path'])
+            if prev_entry is not None:
+                entry = dict(entry)
+                entry['time'] = prev_entry['time']
+            entries[entry['path']] = entry
+
+    def get_manifest(self):
+        """ the artifacts in the manifest
+            Returns a dictionary from the path of every file, relative to 
+            log_dir, to its manifest entry. The manifest file is read once 
+            and then kept up to date by the writers of this logger.
+        """
+        with self._dir_index_lock:
+            if self._manifest_entries is None:
+                entries = {}
+                try:
+                    with open(self.manifest_fpath) as f_manifest:
+                        for line in f_manifest:
+                            try:
+                                self._apply_manifest_entry(
+                                    entries, json.loads(line))
+                            except Exception: pass
+                except OSError: pass
+                self._manifest_entries = entries
+            return self._manifest_entries
+
+    def _get_flist_manifest(self, var_name, suffix = None):
+        """ get_flist using the manifest
+            The same patterns as get_flist are matched against the paths
+            in the manifest. The files are sorted by when they were logged.
+        """
+        self.flush_manifest()
+        entries = self.get_manifest()
+        with self._dir_index_lock:
+            paths = list(entries)
+        
+        def _match_parts(path_parts, pattern_parts):
+            # ** is zero or more directories, as in Path.glob
+            if not pattern_parts:
+                return not path_parts
+            if pattern_parts[0] == '**':
+                return any([_match_parts(path_parts[cnt:], pattern_parts[1:])
+                            for cnt in range(len(path_parts) + 1)])
+            return ((len(path_parts) > 0) and 
+                    fnmatchcase(path_parts[0], pattern_parts[0]) and 
+                    _match_parts(path_parts[1:], pattern_parts[1:]))
+        
+        def _match(pattern):
+            pattern_parts = pattern.strip('/').split('/')
+            return [path for path in paths 
+                    if _match_parts(path.split('/'), pattern_parts)]
+        
+        matched = _match(var_name)
+        if not matched:
+            if suffix is None:
+                if len(var_name.split('/')[-1].split('.')) == 1:
+                    matched = _match(var_name + '.*')
+            else:
+                matched = _match(var_name + '.' + suffix.strip('.'))
+        if not matched:
+            matched = _match(var_name + '/*')
+        matched.sort(key = lambda path: (entries[path]['time'], path))
+        return [self.log_dir / path for path in matched]
+
+    def flush_manifest(self):
+        """ make sure the manifest file has all entries on the disk """
+        if not self.manifest: return
+        with self._file_handles_lock:
+            f = self._file_handles.get(str(self.manifest_fpath))
+            if f is not None:
+                f.flush()
+
+    def _get_segments(self, var_name, suffix = '*'):
+        """ files of a series made by rotation or time tags
+            For a name such as mylog, the series is mylog.txt, if it exists,
+            followed by mylog_<tag>.txt files, where tag is a number. 
+            Names with wildcards do not make a series.
+        """
+        if any(_ in var_name for _ in '*?['):
+            return []
+        suffix = suffix.strip('.')
+        _var_name = (self.log_dir / var_name).name
+        _var_dir = (self.log_dir / var_name).parent
+        if not _var_dir.is_dir():
+            return []
+        tag_patt = re.compile(
+            re.escape(_var_name) + r'(_\d+(\.\d+)?)+')
+        flist = []
+        for fpath in _var_dir.glob(f'{_var_name}*.{suffix}'):
+            if not fpath.is_file():
+                continue
+            if ((fpath.stem == _var_name) or 
+                tag_patt.fullmatch(fpath.stem)):
+                flist.append(fpath)
+        return sort_by_time_tag(flist)
+
+    def _expand_segments(self, var_name, flist):
+        """ a log name that found its first file gets all of its segments
+            If var_name is the name of a log without its suffix, e.g. mylog
+            and flist is only mylog.txt, the files that rotation made after
+            it are added in the order they were written.
+        """
+        if ((len(flist) != 1) or (flist[0].stem != var_name.split('/')[-1])):
+            return flist
+        series = self._get_segments(var_name, flist[0].suffix)
+        if len(series) > 1:
+            return series
         return flist
 
     def get_namelist(self, var_name, suffix = None):
@@ -2072,7 +3201,7 @@ class getLogger:
         return(flist_A_new, flist_B_new)
 
     def get_text(self, log_name='main_log', flist = None, suffix = 'txt',
-                       file_index = -1):
+                       file_index = -1, segments = False):
         """ get text log files
             Given the log_name, this function returns the text therein.
 
@@ -2087,13 +3216,32 @@ class getLogger:
             :param file_index: int or list[int]
                 a number or a list of numbers for the index of the file 
                 to include, default: -1
+            :param segments: bool
+                If True, the files are the segments of the log made because
+                of log_size_limit, in the order they were written, so 
+                file_index = -1 is the latest one. A log name without 
+                wildcards gets its segments in this order anyway, through 
+                get_flist. default: False
 
         """
         self.assert_log_dir()
         if isinstance(file_index, int):
             file_index = [file_index]
         if not flist:
-            flist = self.get_flist(log_name, suffix)
+            param_dir, param_name, _suffix = self._param_dir_name_suffix(
+                log_name, suffix)
+            if _suffix is None:
+                _suffix = 'txt'
+            log_dirnamesuffix = self._get_dirnamesuffix(
+                param_dir, param_name, _suffix)
+            if log_dirnamesuffix in self._loggers_dict:
+                self.text_flush(log_dirnamesuffix, flush = True)
+                if self.async_writer is not None:
+                    self.async_writer.join()
+            if segments & (suffix is not None):
+                flist = self._get_segments(log_name, suffix)
+            if not flist:
+                flist = self.get_flist(log_name, suffix)
         n_files = len(flist)
         if (n_files>0):
             txt = []
@@ -2150,7 +3298,7 @@ class getLogger:
 
     def _load(self, var_name, file_index = None, 
                    suffix = None, read_func = None, verbose = False,
-                   return_collection = False):
+                   return_collection = False, mmap_mode = None):
         """ get a single variable
             return the value of a saved variable.
 
@@ -2170,9 +3318,16 @@ class getLogger:
             :param return_collection:
                 if True, then tries to read the text as if a list/dict/tuple had been
                 logged.
+            :param mmap_mode:
+                passed to np.load for .npy files, e.g. 'r' to get a memory
+                mapped array that is read from the disk only when indexed.
             .. note::
                 when reading a MATLAB file, the output is a dictionary.
                 Also when reading a npz except if it is made by record
+                A record made with suffix npy by this logger, or found in
+                the manifest, is returned as a tuple of time and data. 
+                Otherwise it is the structured array with fields time and 
+                data.
         """
         self.assert_log_dir()
         assert file_index == int(file_index), \
@@ -2207,8 +3362,12 @@ class getLogger:
                     buf = np.load(var_path)
                     try: #check if it is made by record
                         assert len(buf.files) == 2
-                        time_array = buf['time']
-                        data_array = buf['data']
+                        if 'time_array' in buf.files:
+                            time_array = buf['time_array']
+                            data_array = buf['data_array']
+                        else:
+                            time_array = buf['time']
+                            data_array = buf['data']
                         data_array = data_array[time_array > 0]
                         time_array = time_array[time_array > 0]
                         return((time_array, data_array), var_path)
@@ -2217,7 +3376,12 @@ class getLogger:
                             buf = dict(buf)
                         return(buf, var_path)
                 if(var_path.suffix == '.npy'):
-                    try: return(np.load(var_path), var_path)
+                    try: 
+                        buf = np.load(var_path, mmap_mode = mmap_mode)
+                        if ((buf.dtype.names == ('time', 'data')) and 
+                            self._is_record_file(var_path)):
+                            return((buf['time'], buf['data']), var_path)
+                        return(buf, var_path)
                     except: pass
                 if(var_path.suffix == '.mat'):
                     try: 
@@ -2239,6 +3403,12 @@ class getLogger:
                         from torch import load as torch_load 
                         return(torch_load(var_path), var_path)
                     except: pass
+                if (var_path.suffix == '.pltspec'):
+                    # pickled by defer_plots, only render_plots opens it
+                    if verbose:
+                        self.text(None, f'{var_path} is a deferred plot.'
+                                        + ' Use render_plots to draw it.')
+                    return None, None
                 try:    #png, jpg, ...
                     from matplotlib.pyplot import imread
                     img = imread(var_path)
@@ -2265,7 +3435,8 @@ class getLogger:
     
     def load(self, var_name, file_index = -1, 
                    suffix = None, read_func = None, verbose = False,
-                   return_fpath = False, return_collection = False):
+                   return_fpath = False, return_collection = False,
+                   mmap_mode = None):
         """ get a single variable
             return the value of a saved variable.
 
@@ -2282,15 +3453,22 @@ class getLogger:
                 supported.
             :param read_func:
                 a function that takes the Posix path and returns data
+            :param mmap_mode:
+                passed to np.load for .npy files, e.g. 'r' to get a memory
+                mapped array that is read from the disk only when indexed.
             .. note::
                 when reading a MATLAB file, the output is a dictionary.
                 Also when reading a npz except if it is made by record
+                A record made with suffix npy by this logger, or found in
+                the manifest, is returned as a tuple of time and data. 
+                Otherwise it is the structured array with fields time and 
+                data.
         """
         self.assert_log_dir()
         loaded_data, fpath = self._load(
             var_name = var_name, file_index = file_index, suffix = suffix, 
             read_func = read_func, verbose = verbose,
-            return_collection = return_collection)   
+            return_collection = return_collection, mmap_mode = mmap_mode)   
         if return_fpath:
             return loaded_data, fpath
         else:
@@ -2298,7 +3476,8 @@ class getLogger:
         
     def get_stack_from_files(self, 
         var_name = None, flist = [], suffix = None, read_func = None,
-        return_flist = False):
+        return_flist = False, mmap_mode = None, lazy = False, 
+        n_workers = 1):
        
         """ Get list or data of all files in a directory
        
@@ -2324,6 +3503,23 @@ class getLogger:
                 the function that takes the posix path of a file and returns
                 the data in there.
            
+            :param mmap_mode:
+                passed to np.load when files are read by np.load, 
+                e.g. 'r' so that frames are memory mapped.
+            :type mmap_mode: str
+           
+            :param lazy:
+                if True, a lazystack is returned. It has shape and dtype 
+                and reads the files only when it is indexed, e.g. 
+                stack[10] or stack[10:20, :, 5]. default: False
+            :type lazy: bool
+           
+            :param n_workers:
+                number of threads that read the files. Reading is mostly
+                waiting for the disk or network so threads help on network
+                file systems. The order of flist is kept. default: 1
+            :type n_workers: int
+           
             Output
             ----------
                 It returns a list of data in all files or a numpy array if 
@@ -2338,11 +3534,15 @@ class getLogger:
                 f'File not found: {flist[0]}. You can use get_flist'
         
         if flist:
-            n_files = len(flist)
+            fdata = None
             if(read_func is None):
                 try:
-                    fdata = np.load(flist[0])
-                    read_func = np.load
+                    fdata = np.load(flist[0], mmap_mode = mmap_mode)
+                    if mmap_mode is None:
+                        read_func = np.load
+                    else:
+                        read_func = lambda fpath: np.load(
+                            fpath, mmap_mode = mmap_mode)
                 except: pass
             if(read_func is None):
                 try:
@@ -2350,54 +3550,126 @@ class getLogger:
                     fdata = imread(flist[0])
                     read_func = imread
                 except: pass
-            try:
-                read_func(flist[0])
-            except Exception as e:
-                if flist[0].is_file():
-                    self.text(None, 
-                        f'lognflow: The data file {flist[0]} could not be read.'
-                        'Please provide a read_function for this file.')
-                else:
-                    self.text(
-                        None, f'File {flist[0]} does not exist.')
-                raise e
-            dataset = [read_func(fpath) for fpath in flist]
-            try:
-                dataset_array = np.array(dataset, dtype=dataset[0].dtype)
-            except:
-                dataset_array = dataset
+            if fdata is None:
+                try:
+                    fdata = read_func(flist[0])
+                except Exception as e:
+                    if flist[0].is_file():
+                        self.text(None, 
+                            f'lognflow: The data file {flist[0]} could not'
+                            ' be read. Please provide a read_function for'
+                            ' this file.')
+                    else:
+                        self.text(
+                            None, f'File {flist[0]} does not exist.')
+                    raise e
+            if lazy:
+                dataset_array = lazystack(flist, read_func)
+            else:
+                dataset_array = self._stack_frames(
+                    fdata, self._map_ordered(read_func, flist[1:], n_workers),
+                    len(flist))
             
             if return_flist:
                 return(dataset_array, flist)
             else:
                 return(dataset_array)
 
+    def _map_ordered(self, func, items, n_workers = 1):
+        """ yield func(item) for items in order
+            If n_workers > 1, a thread pool runs func and at most
+            2 * n_workers results are waiting to be consumed. An exception
+            raised by func is raised here when its result is reached.
+        """
+        if n_workers is None or n_workers <= 1:
+            for item in items:
+                yield func(item)
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        from collections import deque
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers = n_workers) as executor:
+            futures = deque()
+            try:
+                for item in items:
+                    futures.append(executor.submit(func, item))
+                    if len(futures) >= 2 * n_workers:
+                        yield futures.popleft().result()
+                while futures:
+                    yield futures.popleft().result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _stack_frames(self, first_frame, frames, n_frames):
+        """ stack frames into a preallocated array
+            The output is allocated from the shape and dtype of the first
+            frame and the rest are copied into it one by one, so there is
+            never a second copy of the whole stack. If a frame has a
+            different shape, or frames are not arrays, a list is returned.
+        """
+        if not isinstance(first_frame, np.ndarray):
+            return [first_frame] + list(frames)
+        dataset = np.empty((n_frames, ) + first_frame.shape, 
+                           dtype = first_frame.dtype)
+        dataset[0] = first_frame
+        frames = iter(frames)
+        n_filled = 1
+        for frame in frames:
+            if((not isinstance(frame, np.ndarray)) | 
+               (np.shape(frame) != first_frame.shape)):
+                return list(dataset[:n_filled]) + [frame] + list(frames)
+            dataset[n_filled] = frame
+            n_filled += 1
+        if n_filled < n_frames:
+            dataset = dataset[:n_filled]
+        return dataset
+
     def get_stack_from_names(self, 
-             var_names = None, read_func = None, return_flist = False):
+             var_names = None, read_func = None, return_flist = False,
+             n_workers = 1):
+        """ Get data of all files of a list of variable names
+            All snapshots of every name are loaded in order and are stacked
+            into a numpy array if they have the same shape, otherwise a list
+            is returned.
+            
+            :param var_names:
+                a variable name or a list of them, may have wildcards
+            :param read_func:
+                the function that takes the posix path of a file and returns
+                the data in there.
+            :param n_workers:
+                number of threads that read the files, default: 1
+        """
         self.assert_log_dir()
-        try:
-            var_names_str = str(var_names)
-        except: pass
-        else:
+        if isinstance(var_names, str):
             var_names = [var_names]
         assert var_names == list(var_names), \
             'input should be a list of variable names'
-        dataset = []
-        flist = []
+        names_indices = []
         for name in var_names:
             images_flist = self.get_flist(name)
-            if images_flist:
-                for file_index in range(len(images_flist)):
-                    data, fpath = self.load(
-                        name, file_index = file_index,
-                        read_func = read_func, return_fpath = True)
-                    if data is not None:
-                        dataset.append(data)
-                        flist.append(fpath)
+            for file_index in range(len(images_flist)):
+                names_indices.append((name, file_index))
 
-        try:
-            dataset = np.array(dataset, dtype=dataset[0].dtype)
-        except: pass
+        flist = []
+        def _load_name_index(name_index):
+            return self.load(name_index[0], file_index = name_index[1],
+                             read_func = read_func, return_fpath = True)
+        def _frames():
+            for data, fpath in self._map_ordered(
+                    _load_name_index, names_indices, n_workers):
+                if data is not None:
+                    flist.append(fpath)
+                    yield data
+        
+        frames = _frames()
+        first_frame = next(frames, None)
+        if first_frame is None:
+            dataset = []
+        else:
+            dataset = self._stack_frames(
+                first_frame, frames, len(names_indices))
                         
         if return_flist:
             return dataset, flist
@@ -2428,7 +3700,7 @@ class getLogger:
                     'lognflow, replace_time_with_index:' +\
                     'the given pattern has no * and no files were found')
         if flist:
-            flist.sort()
+            flist = sort_by_time_tag(flist)
             fcnt_width = len(str(len(flist)))
             for fcnt, fpath in enumerate(flist):
                 f_time_stamp = fpath.stem.split('_')[-1]
@@ -2438,7 +3710,9 @@ class getLogger:
                         f_time_stamp = float(f_time_stamp)
                         fname_new = fname_old[0] + f'{f_time_stamp:0.1f}' + fname_old[1]
                         fpath_new = flist[fcnt].parent / fname_new
+                        self._close_file_handle(flist[fcnt])
                         flist[fcnt].rename(fpath_new)
+                        self._log_artifact_moved(flist[fcnt], fpath_new)
                         flist[fcnt] = fpath_new
                 except: pass
 
@@ -2452,7 +3726,9 @@ class getLogger:
                 fpath_new = flist[fcnt].parent / fname_new
                 if verbose:
                     self.text(None, f'To {fpath_new.name}')
+                self._close_file_handle(flist[fcnt])
                 flist[fcnt].rename(fpath_new)
+                self._log_artifact_moved(flist[fcnt], fpath_new)
 
     def __call__(self, *args, **kwargs):
         """calling the object
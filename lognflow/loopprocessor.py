@@ -6,6 +6,7 @@ from numpy import zeros       as np_zeros
 from numpy import argsort     as np_argsort
 from numpy import unique      as np_unique
 from .utils import is_builtin_collection
+from .multiprocessor import _get_from_queue
 
 def _to_collection(returned_obj):
     if not is_builtin_collection(returned_obj):
@@ -63,6 +64,7 @@ class loopprocessor():
         self.any_error = False
         self.error_event = Event()
         self.empty_queue = False
+        self.processes = []
     
     def __call__(self, *args, **kwargs):
         if (len(args) == 0) & (len(kwargs) == 0):
@@ -76,9 +78,11 @@ class loopprocessor():
         single_queue_access = True
         while(single_queue_access | release_a_cpu | self.empty_queue):
             single_queue_access = False
-        
-            if (not self.aQ.empty()):
-                aQElement = self.aQ.get()
+            
+            block = ((release_a_cpu | self.empty_queue) 
+                     & (self.numProcessed < self.procID))
+            aQElement = _get_from_queue(self.aQ, block, self.processes)
+            if aQElement is not None:
                 ret_procID_range = aQElement[0]
                 ret_result = aQElement[1]
                 if ((not self.any_error) & aQElement[2]):
@@ -120,8 +124,12 @@ class loopprocessor():
                 if(self.test_mode):
                     _loopprocessor_function_test_mode(*_args)
                 else:
-                    Process(target = _loopprocessor_function, 
-                            args = _args).start()
+                    proc = Process(target = _loopprocessor_function, 
+                                   args = _args)
+                    proc.start()
+                    self.processes = [
+                        _ for _ in self.processes if _.exitcode != 0]
+                    self.processes.append(proc)
                 self.procID += 1
                 self.numBusyCores += 1
     
@@ -1,17 +1,46 @@
 from numpy import array       as np_array,\
                   ceil        as np_ceil,\
                   arange      as np_arange,\
-                  minimum     as np_minimum,\
                   argsort     as np_argsort,\
-                  unique      as np_unique
+                  unique      as np_unique,\
+                  ndarray     as np_ndarray,\
+                  memmap      as np_memmap,\
+                  frombuffer  as np_frombuffer
 
-from multiprocessing import Process, Queue, cpu_count, Event
+from multiprocessing import Process, Queue, cpu_count, Event, \
+                            get_start_method
+# multiprocessing.util joins the processes that are not daemons at exit,
+# it is imported before _close_open_pools is registered to run after it.
+import multiprocessing.util  # noqa: F401
+from queue import Empty as queue_Empty
+import time
+import atexit
+import weakref
 from .printprogress import printprogress
 from .utils import assure_is_collection
 
+def _get_from_queue(aQ, block = True, processes = []):
+    """ get the next element of a queue, waiting for it without spinning
+        While waiting, the processes are checked every second and if one 
+        of them has died, e.g. by a segmentation fault, ChildProcessError 
+        is raised instead of waiting for ever. If block is False, None is 
+        returned when the queue is empty.
+    """
+    while True:
+        try:
+            return aQ.get(block = block, timeout = 1 if block else None)
+        except queue_Empty:
+            if not block:
+                return None
+            for proc in processes:
+                if proc.exitcode not in (None, 0):
+                    raise ChildProcessError(
+                        f'lognflow: the process {proc.name} has exited '
+                        f'with the code {proc.exitcode}.')
+
 def _multiprocessor_function_test_mode(
         iterables_batch, targetFunction, \
-        shareables, theQ, procID_range, error_event):
+        shareables, theQ, procID_range, error_event, worker_ID = None):
     outputs = []
     for idx, procCnt in enumerate(procID_range):
         if len(iterables_batch) == 1:
@@ -25,10 +54,11 @@ def _multiprocessor_function_test_mode(
         else:
             results = targetFunction(iterables_sliced, shareables)
         outputs.append(assure_is_collection(results))
-    theQ.put([procID_range, outputs, False])
+    theQ.put([procID_range, outputs, False, worker_ID])
 
 def _multiprocessor_function(iterables_batch, targetFunction, \
-        shareables, theQ, procID_range, error_event):
+        shareables, theQ, procID_range, error_event, worker_ID = None,
+        shared_outputs = None):
     outputs = []
     for idx, procCnt in enumerate(procID_range):
         try:
@@ -47,9 +77,349 @@ def _multiprocessor_function(iterables_batch, targetFunction, \
         except Exception as e:
             if not error_event.is_set():
                 error_event.set()
-            theQ.put([np_array([procCnt]), None, True])
+            theQ.put([np_array([procCnt]), None, True, worker_ID])
+            return
+    if shared_outputs is not None:
+        try:
+            shared_outputs[procID_range] = outputs
+        except Exception as e:
+            if not error_event.is_set():
+                error_event.set()
+            theQ.put([procID_range[:1], None, True, worker_ID])
+            return
+        outputs = None
+    theQ.put([procID_range, outputs, False, worker_ID])
+
+class _sharedarray:
+    """ name, shape and dtype of a numpy array in shared memory
+        This is what is sent to the workers instead of the array.
+    """
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def attach(self, attached):
+        from multiprocessing.shared_memory import SharedMemory
+        if self.name not in attached:
+            attached[self.name] = SharedMemory(name = self.name)
+        return np_ndarray(self.shape, dtype = self.dtype, 
+                          buffer = attached[self.name].buf)
+
+class _forkedarray:
+    """ index of an array of iterables that workers have from the fork """
+    def __init__(self, index):
+        self.index = index
+
+class _memmaparray:
+    """ file, offset, shape and dtype of a memory mapped array
+        This is sent to the workers instead of a np.memmap, they map the
+        file themselves and read only the pages of their slices.
+    """
+    def __init__(self, arr):
+        import mmap
+        self.filename = arr.filename
+        self.shape = arr.shape
+        self.dtype = arr.dtype
+        self.mode = arr.mode
+        mmap_offset = arr.offset - arr.offset % mmap.ALLOCATIONGRANULARITY
+        self.offset = mmap_offset + arr.ctypes.data \
+            - np_frombuffer(arr._mmap, dtype = 'uint8').ctypes.data
+
+    def attach(self, attached):
+        import mmap
+        key = (self.filename, self.mode)
+        if key not in attached:
+            access = {'r': mmap.ACCESS_READ, 'c': mmap.ACCESS_COPY}.get(
+                self.mode, mmap.ACCESS_WRITE)
+            with open(self.filename, 'rb' if self.mode == 'r' else 'r+b') \
+                    as fp:
+                attached[key] = mmap.mmap(fp.fileno(), 0, access = access)
+        return np_ndarray(self.shape, dtype = self.dtype, 
+                          buffer = attached[key], offset = self.offset)
+
+def _is_memmap(arr):
+    """ if arr is a C-contiguous view of a file mapped by np.memmap """
+    return (isinstance(arr, np_memmap) 
+            and (getattr(arr, '_mmap', None) is not None) 
+            and (arr.filename is not None) and arr.flags.c_contiguous)
+
+class _prefetcher:
+    """ reads points of a generator in a thread, up to n_prefetch ahead
+        so that reading, e.g. from a disk, goes on while workers run.
+    """
+    def __init__(self, generator, n_prefetch):
+        import threading
+        from queue import Queue as queue_Queue
+        self.buffer = queue_Queue(maxsize = max(int(n_prefetch), 1))
+        self.exhausted = False
+        self.stopped = False
+        self.error = None
+        self.thread = threading.Thread(
+            target = self._read, args = (generator, ), daemon = True)
+        self.thread.start()
+
+    def _read(self, generator):
+        try:
+            for point in generator:
+                self.buffer.put((True, point))
+                if self.stopped:
+                    return
+        except Exception as e:
+            self.error = e
+        if not self.stopped:
+            self.buffer.put((False, None))
+
+    def take(self, n_points):
+        points = []
+        while (len(points) < n_points) & (not self.exhausted):
+            has_point, point = self.buffer.get()
+            if has_point:
+                points.append(point)
+            else:
+                self.exhausted = True
+                if self.error is not None:
+                    raise self.error
+        return points
+
+    def close(self):
+        self.stopped = True
+        while True:
+            try:
+                self.buffer.get_nowait()
+            except queue_Empty:
+                break
+
+def _has_shared_memory():
+    """ multiprocessing.shared_memory is there from Python 3.8, before that
+        arrays are pickled with every batch.
+    """
+    try:
+        from multiprocessing import shared_memory, resource_tracker
+        return True
+    except ImportError:
+        return False
+
+def _share_arrays(obj, shms):
+    """ put numpy arrays, or those in a tuple or a list, in shared memory
+        the SharedMemory objects are appended to shms, to be unlinked by
+        the caller.
+    """
+    if isinstance(obj, (tuple, list)):
+        return type(obj)([_share_arrays(_, shms) for _ in obj])
+    if ((not isinstance(obj, np_ndarray)) or obj.dtype.hasobject 
+        or (obj.size == 0) or (not _has_shared_memory())):
+        return obj
+    from multiprocessing.shared_memory import SharedMemory
+    shm = SharedMemory(create = True, size = obj.nbytes)
+    shms.append(shm)
+    shared = np_ndarray(obj.shape, dtype = obj.dtype, buffer = shm.buf)
+    shared[...] = obj
+    return _sharedarray(shm.name, obj.shape, obj.dtype)
+
+def _attach_arrays(obj, attached):
+    if isinstance(obj, (tuple, list)):
+        return type(obj)([_attach_arrays(_, attached) for _ in obj])
+    if isinstance(obj, _sharedarray):
+        return obj.attach(attached)
+    return obj
+
+def _release_shms(shms, unlink = False):
+    for shm in shms:
+        try:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        except Exception:
+            pass
+
+def _workerpool_function(
+        worker_ID, task_Q, theQ, error_event, targetFunction, shareables,
+        forked_iterables = None):
+    shareables_attached = {}
+    shareables = _attach_arrays(shareables, shareables_attached)
+    attached = {}
+    while True:
+        task = task_Q.get()
+        if task is None:
             return
-    theQ.put([procID_range, outputs, False])
+        if task[0] == 'setup':
+            targetFunction = task[1]
+            shareables = None
+            _release_shms(shareables_attached.values())
+            shareables_attached = {}
+            shareables = _attach_arrays(task[2], shareables_attached)
+        elif task[0] == 'release':
+            _release_shms(attached.values())
+            attached = {}
+        else:
+            iterables_batch, procID_range, shared_outputs = task[1:]
+            start, stop = procID_range[0], procID_range[-1] + 1
+            iterables_batch = list(iterables_batch)
+            for cnt, iim in enumerate(iterables_batch):
+                if isinstance(iim, (_sharedarray, _memmaparray)):
+                    iterables_batch[cnt] = iim.attach(attached)[start:stop]
+                elif isinstance(iim, _forkedarray):
+                    iterables_batch[cnt] = \
+                        forked_iterables[iim.index][start:stop]
+            if shared_outputs is not None:
+                shared_outputs = shared_outputs.attach(attached)
+            _multiprocessor_function(
+                iterables_batch, targetFunction, shareables, theQ, 
+                procID_range, error_event, worker_ID, shared_outputs)
+            iterables_batch = shared_outputs = None
+
+_open_pools = weakref.WeakSet()
+
+@atexit.register
+def _close_open_pools():
+    """ workers are not daemons, so they can start processes of their own.
+        The pools that are still open at the exit are closed here, before
+        multiprocessing joins the processes.
+    """
+    for pool in list(_open_pools):
+        try:
+            pool.close(timeout = 1)
+        except Exception:
+            pass
+
+class workerpool:
+    """ processes that stay alive to run many batches of multiprocessor
+    
+        multiprocessor and multiprocessor_gen make a workerpool for every 
+        call if they are not given one. Every worker gets the targetFunction
+        and shareables once per call, or when the process starts, and then
+        only the batches are sent to it. Numpy arrays in shareables are put in 
+        shared memory when they are sent, so there is only one copy of 
+        them for all workers. Giving the same pool to many calls of
+        multiprocessor saves starting the processes every time::
+        
+            with workerpool(max_cpu = 8) as pool:
+                for data in datasets:
+                    results = multiprocessor(
+                        func, data, shareables, pool = pool)
+        
+        :param max_cpu: number of processes, default: cpu_count()
+        :param targetFunction, shareables: 
+            if given, processes start with them, so with the fork method
+            of Linux they are not pickled at all.
+        :param forked_iterables:
+            list of arrays that batches can refer to by _forkedarray, only
+            with the fork method.
+        
+        If a worker dies, e.g. by a segmentation fault, multiprocessor 
+        raises ChildProcessError, marks the pool as broken and closes it.
+        The next call starts new processes with new queues.
+    """
+    def __init__(self, max_cpu = None, targetFunction = None, 
+                 shareables = None, forked_iterables = None):
+        if max_cpu is None:
+            max_cpu = cpu_count()
+        self.max_cpu = max_cpu
+        self.targetFunction = targetFunction
+        self.shareables = shareables
+        self.forked_iterables = forked_iterables
+        self.aQ = Queue()
+        self.error_event = Event()
+        self.task_Qs = []
+        self.processes = []
+        self.shms = []
+        self.broken = False
+        self._fresh = False
+    
+    def start(self):
+        if self.processes:
+            return self
+        if self.broken:
+            # a dead worker may have left the locks of the queues held
+            self.aQ = Queue()
+            self.error_event = Event()
+            self.broken = False
+        import os
+        if (os.name == 'posix') and _has_shared_memory():
+            # workers use the resource tracker of this process for the
+            # shared memory, so it does not unlink blocks when they exit.
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        shareables = self.shareables
+        if get_start_method() != 'fork':
+            shareables = _share_arrays(shareables, self.shms)
+        for worker_ID in range(self.max_cpu):
+            task_Q = Queue()
+            proc = Process(target = _workerpool_function, 
+                           args = (worker_ID, task_Q, self.aQ, 
+                                   self.error_event, self.targetFunction, 
+                                   shareables, self.forked_iterables))
+            proc.start()
+            self.task_Qs.append(task_Q)
+            self.processes.append(proc)
+        # the workers have targetFunction and shareables as they are now
+        self._fresh = True
+        _open_pools.add(self)
+        return self
+    
+    def setup(self, targetFunction, shareables):
+        """ send targetFunction and shareables to all workers
+            They are sent for every call, since the shareables may have
+            been changed in place, except when the processes have just 
+            started with them.
+        """
+        self.start()
+        self.error_event.clear()
+        fresh, self._fresh = self._fresh, False
+        if (fresh & (targetFunction is self.targetFunction) & 
+            (shareables is self.shareables)):
+            return
+        self.targetFunction = targetFunction
+        self.shareables = shareables
+        shms = []
+        shared_shareables = _share_arrays(shareables, shms)
+        for task_Q in self.task_Qs:
+            task_Q.put(('setup', targetFunction, shared_shareables))
+        # the old blocks are unlinked, workers free them at the setup
+        _release_shms(self.shms, unlink = True)
+        self.shms = shms
+    
+    def submit(self, worker_ID, iterables_batch, procID_range, 
+               shared_outputs = None):
+        self.task_Qs[worker_ID].put(
+            ('batch', iterables_batch, procID_range, shared_outputs))
+    
+    def release(self):
+        """ workers close the shared memory of the iterables and outputs """
+        for task_Q in self.task_Qs:
+            task_Q.put(('release', ))
+    
+    def close(self, timeout = 5):
+        """ ask the workers to exit and terminate those that do not
+            
+            :param timeout: 
+                seconds to wait for all workers to exit by themselves.
+        """
+        for task_Q in self.task_Qs:
+            task_Q.put(None)
+        time_of_end = time.time() + timeout
+        for proc in self.processes:
+            proc.join(max(time_of_end - time.time(), 0))
+        for proc in self.processes:
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+                self.broken = True
+        if self.broken:
+            for task_Q in self.task_Qs + [self.aQ]:
+                task_Q.cancel_join_thread()
+        self.task_Qs = []
+        self.processes = []
+        _open_pools.discard(self)
+        _release_shms(self.shms, unlink = True)
+        self.shms = []
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *args):
+        self.close()
 
 def _prepare_outpus(outputs, Q_procID, concatenate_outputs, outputs_is_given):
     if(outputs_is_given):
@@ -120,7 +490,7 @@ def _prepare_outpus(outputs, Q_procID, concatenate_outputs, outputs_is_given):
 
 def _reraise_any_error(
         any_error, targetFunction, error_ret_procID, iterables, 
-        shareables, aQ, error_event, logger):            
+        shareables, aQ, error_event, logger, iterables_batch = None):
     logger('-'*79)
     logger('An exception occured during submitting jobs.')
     logger('Here we try to reproduce it but will raise '
@@ -131,15 +501,322 @@ def _reraise_any_error(
     logger('to avoid seeing this message, pass the argument called '\
            'logger, it is print by default.')
     logger('-'*79)
-    iterables_batch = ()
-    for iim in iterables:
-        iterables_batch = \
-            iterables_batch + (iim[error_ret_procID], )
+    if iterables_batch is None:
+        iterables_batch = ()
+        for iim in iterables:
+            iterables_batch = \
+                iterables_batch + (iim[error_ret_procID], )
     _args = (iterables_batch, ) + (
         targetFunction, shareables, aQ, error_ret_procID, error_event)
     _multiprocessor_function_test_mode(*_args)
     raise ChildProcessError
+
+class _batchsizer:
+    """ sizes of the batches of multiprocessor
+        If batchSize is given, all batches have that size, but not more 
+        than n_pts / max_cpu / 2. Otherwise, a batch is a share of the 
+        points that remain, remaining / (2 * n_workers), so batches are 
+        large at the start and get smaller towards the end where all 
+        workers should finish together. The time per point is measured
+        from the batches that arrive. A batch is made shorter than 
+        max_period seconds, so a few expensive points do not keep one 
+        worker busy while others wait, and longer than min_period, so 
+        cheap points do not pay for sending batches one by one. Before 
+        any batch has arrived, batches are a quarter of that share.
+        If the number of points is not known, remaining is None and 
+        batches are made to take about min_period.
+    """
+    def __init__(self, n_pts, n_workers, batchSize = None, 
+                 min_period = 0.02, max_period = 1.0):
+        self.n_workers = max(n_workers, 1)
+        self.fixed_size = None
+        if batchSize is not None:
+            self.fixed_size = max(1, int(batchSize))
+            if n_pts is not None:
+                self.fixed_size = max(1, min(self.fixed_size, 
+                    int(np_ceil(n_pts / self.n_workers / 2))))
+        self.min_period = min_period
+        self.max_period = max_period
+        self.time_per_point = None
+    
+    def __call__(self, remaining):
+        if self.fixed_size is not None:
+            if remaining is None:
+                return self.fixed_size
+            return min(self.fixed_size, remaining)
+        if remaining is None:
+            if not self.time_per_point:
+                return 1
+            return max(1, int(self.min_period / self.time_per_point))
+        size = int(np_ceil(remaining / (2 * self.n_workers)))
+        if self.time_per_point is None:
+            size = int(np_ceil(size / 4))
+        elif self.time_per_point > 0:
+            size = min(size, int(self.max_period / self.time_per_point))
+            size = max(size, int(self.min_period / self.time_per_point))
+        return max(1, min(size, remaining))
     
+    def update(self, n_points, period):
+        time_per_point = period / max(n_points, 1)
+        if self.time_per_point is None:
+            self.time_per_point = time_per_point
+        else:
+            self.time_per_point = \
+                0.7 * self.time_per_point + 0.3 * time_per_point
+
+def _parse_iterables(iterables):
+    if hasattr(iterables, '__next__'):
+        return None, iterables
+    try:
+        n_pts = int(iterables)
+        assert n_pts == iterables, \
+            'if iterables is a single number, please provide an integer.'
+        iterables = [np_arange(n_pts, dtype='int')]
+    except:
+        try:
+            n_pts = iterables.shape[0]
+            iterables = [iterables]
+        except:
+            try:
+                n_pts = len(iterables[0])
+            except:
+                try:
+                    n_pts = iterables[0].shape[0]
+                except Exception as e:
+                    raise Exception(
+                        'You did not provide iterables properly.'
+                        ' It should be either a list or tuple where all members'
+                        ' have the same length (first dimensions) or it can be'
+                        ' a numpy array to iterate over, or it can be an'
+                        ' integer.'
+                        ) from e
+    return n_pts, iterables
+
+def _multiprocessor_batches(
+        targetFunction, iterables, shareables, outputs, max_cpu, batchSize, 
+        concatenate_outputs, verbose, test_mode, logger, pool, 
+        shared_memory, max_in_flight = None, n_released = None, 
+        prefetch = None):
+    """ the scheduler of multiprocessor, multiprocessor_gen and 
+        multiprocessor_imap. It sends batches to the workers of a 
+        workerpool and yields (procID_range, results) of every batch that
+        arrives. If outputs is a numpy array and shared_memory is True, 
+        workers write into a shared copy of it, its rows are copied to 
+        outputs when they arrive and results is None. If max_in_flight 
+        is given, no more than that many points are sent but not 
+        released, where n_released() tells how many points the caller 
+        has released. np.memmap inputs are read by the workers from their
+        files. If iterables is a generator, n_pts is not known, up to 
+        prefetch points are read ahead of the workers in a thread and
+        batches are lists of points.
+    """
+    n_pts, iterables = _parse_iterables(iterables)
+    streaming = n_pts is None
+    if verbose:
+        logger(f'inputs to iterate over are {n_pts}.')
+
+    if test_mode:
+        logger('TEST mode, uses only 1 CPU')
+
+    if max_cpu is None:
+        max_cpu = cpu_count() if pool is None else pool.max_cpu
+    if streaming & (prefetch is None):
+        prefetch = 4 * max_cpu
+    batchsizer = _batchsizer(n_pts, 1 if test_mode else max_cpu, batchSize)
+    if verbose:
+        logger('lognflow multiprocessor initialized with:') 
+        logger('max_cpu: ', max_cpu)
+        logger('n_pts: ', n_pts)
+        logger('batchSize: ', 'adaptive' if batchsizer.fixed_size is None
+                              else batchsizer.fixed_size)
+        logger('concatenate_outputs: ', concatenate_outputs)
+
+    shared_memory = shared_memory and _has_shared_memory()
+    use_fork = shared_memory & (not test_mode) & (pool is None) \
+        & (not streaming)
+    if use_fork:
+        use_fork = get_start_method() == 'fork'
+    forked_iterables = None
+    if use_fork:
+        # processes made for this call have the arrays from the fork
+        forked_iterables = [
+            iim if (isinstance(iim, np_ndarray) and not _is_memmap(iim))
+            else None for iim in iterables]
+    
+    close_pool = False
+    if test_mode:
+        aQ = Queue()
+        error_event = Event()
+        idle_workers = [None]
+        processes = []
+    else:
+        if pool is None:
+            pool = workerpool(max_cpu if streaming else min(max_cpu, max(n_pts, 1)), 
+                              targetFunction, shareables, forked_iterables)
+            close_pool = True
+        pool.setup(targetFunction, shareables)
+        aQ = pool.aQ
+        error_event = pool.error_event
+        idle_workers = list(range(min(max_cpu, pool.max_cpu)))
+        processes = pool.processes
+    
+    shms = []
+    shared_iterables = iterables
+    shared_outputs = outputs_view = None
+    uses_files = False
+    if (not streaming) & (not test_mode):
+        shared_iterables = []
+        for cnt, iim in enumerate(iterables):
+            if _is_memmap(iim):
+                iim = _memmaparray(iim)
+                uses_files = True
+            elif isinstance(iim, np_ndarray) & use_fork:
+                iim = _forkedarray(cnt)
+            elif isinstance(iim, np_ndarray) & shared_memory:
+                iim = _share_arrays(iim, shms)
+            shared_iterables.append(iim)
+    if (not test_mode) & isinstance(outputs, np_ndarray):
+        if _is_memmap(outputs) and (outputs.mode in ('r+', 'w+')):
+            # workers write into the file and nothing is copied back
+            shared_outputs = _memmaparray(outputs)
+            uses_files = True
+        elif shared_memory:
+            shared_outputs = _share_arrays(outputs, shms)
+            if isinstance(shared_outputs, _sharedarray):
+                outputs_view = shared_outputs.attach({shms[-1].name: shms[-1]})
+            else:
+                shared_outputs = None
+    prefetcher = None
+    if streaming:
+        prefetcher = _prefetcher(iterables, prefetch)
+    
+    procID = 0
+    numProcessed = 0
+    numBusyCores = 0
+    submit_times = {}
+    in_flight = {}
+    if verbose & (not streaming):
+        title = f'Processing {n_pts} data points with {max_cpu} CPUs'
+        if test_mode: title = f'Processing {n_pts} data points with 1 CPU in Test mode'
+        pBar = printprogress(n_pts, title = title)
+    any_error = False
+    
+    try:
+        while (numBusyCores > 0) | (not (
+                prefetcher.exhausted if streaming else procID >= n_pts)):
+            while (len(idle_workers) > 0) & (not any_error):
+                if streaming:
+                    if prefetcher.exhausted:
+                        break
+                    batchSize = batchsizer(None)
+                else:
+                    if procID >= n_pts:
+                        break
+                    batchSize = batchsizer(n_pts - procID)
+                if max_in_flight is not None:
+                    allowance = max_in_flight - (procID - n_released())
+                    if allowance <= 0:
+                        break
+                    batchSize = min(batchSize, allowance)
+                
+                if streaming:
+                    iterables_batch = (prefetcher.take(batchSize), )
+                    batchSize = len(iterables_batch[0])
+                    if batchSize == 0:
+                        break
+                procID_range = np_arange(procID, procID + batchSize, dtype = 'int')
+                
+                if not streaming:
+                    iterables_batch = ()
+                    for iim in shared_iterables:
+                        if not isinstance(iim, (_sharedarray, _forkedarray, 
+                                                _memmaparray)):
+                            iim = iim[procID_range]
+                        iterables_batch = iterables_batch + (iim, )
+                worker_ID = idle_workers.pop()
+                submit_times[worker_ID] = time.time()
+                if streaming:
+                    in_flight[worker_ID] = (procID_range, iterables_batch[0])
+                
+                if test_mode:
+                    _multiprocessor_function_test_mode(
+                        iterables_batch, targetFunction, shareables, aQ, 
+                        procID_range, error_event, worker_ID)
+                else:
+                    pool.submit(worker_ID, iterables_batch, procID_range,
+                                shared_outputs)
+                procID += len(procID_range)
+                numBusyCores += 1
+            
+            if numBusyCores == 0:
+                break
+            aQElement = _get_from_queue(aQ, processes = processes)
+            ret_procID_range = aQElement[0]
+            ret_result = aQElement[1]
+            idle_workers.append(aQElement[3])
+            batchsizer.update(ret_procID_range.shape[0], 
+                              time.time() - submit_times[aQElement[3]])
+            if (not any_error) & aQElement[2]:
+                any_error = True
+                error_ret_procID = ret_procID_range.copy()
+                if streaming:
+                    batch_range, batch_points = in_flight[aQElement[3]]
+                    error_batch = ([batch_points[
+                        error_ret_procID[0] - batch_range[0]]], )
+                try:
+                    pBar._end()
+                except:
+                    pass
+                logger('lognflow, multiprocessor:')
+                logger('An exception has been raised. Joining all processes...')
+            if any_error:
+                logger(f'Number of busy cores: {numBusyCores}')
+
+            _batchSize = ret_procID_range.shape[0]
+            numProcessed += _batchSize
+            numBusyCores -= 1
+            if verbose & (not any_error) & (not streaming):
+                pBar(_batchSize)
+            if any_error & (numBusyCores == 0):
+                logger(f'All cores are free')
+                break
+            if not any_error:
+                if outputs_view is not None:
+                    outputs[ret_procID_range] = \
+                        outputs_view[ret_procID_range]
+                yield ret_procID_range, ret_result
+    except ChildProcessError:
+        # a worker has died, the others may wait on its locks for ever
+        pool.broken = True
+        raise
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+        if (numBusyCores > 0) & (not (pool is not None and pool.broken)):
+            # the generator is closed before the end, the workers stop and 
+            # their batches are taken out of the queue of the pool.
+            error_event.set()
+            try:
+                while numBusyCores > 0:
+                    _get_from_queue(aQ, processes = processes)
+                    numBusyCores -= 1
+            except ChildProcessError:
+                pass
+        outputs_view = None
+        if pool is not None and pool.broken:
+            pool.close(timeout = 1)
+        elif close_pool:
+            pool.close()
+        elif shms or uses_files:
+            pool.release()
+        _release_shms(shms, unlink = True)
+    
+    if any_error:
+        _reraise_any_error(
+            any_error, targetFunction, error_ret_procID, iterables, 
+            shareables, Queue(), error_event, logger,
+            error_batch if streaming else None)
+
 def multiprocessor(
     targetFunction,
     iterables,
@@ -150,7 +827,10 @@ def multiprocessor(
     concatenate_outputs = True,
     verbose             = False,
     test_mode           = False,
-    logger              = print):
+    logger              = print,
+    pool                = None,
+    shared_memory       = True,
+    prefetch            = None):
     """ multiprocessor makes the use of multiprocessing in Python easy and fast
     
     Copyright: it was developed as part of the RobustGaussianFittingLibrary,
@@ -245,14 +925,20 @@ def multiprocessor(
         targetFunction: Target function
         iterables: all iterabel inputs, We will pass them by indexing
             them. if indices are not provideed, the len(iterables[0])
-            will be N.
+            will be N. np.memmap arrays, e.g. from 
+            np.load(..., mmap_mode = 'r'), are not read by this process,
+            each worker maps the file and reads its own slice. iterables
+            can also be a generator, then its data points are read as
+            they are needed and are sent to the workers in lists.
         shareables: all READ-ONLY inputs.... Notice: READ-ONLY 
         outputs: an indexable memory where we can just dump the output of 
             function in relevant indices.  For example a numpy
         max_cpu: max number of allowed CPU
             default: None
         batchSize: how many data points are sent to each CPU at a time
-            default: n_CPU/n_points/2
+            default: None, batches start large and get smaller towards 
+            the end and their sizes follow the time it takes to process
+            a data point, see _batchsizer.
         concatenate_outputs: If an output is np.ndarray and it can be
             concatenated along axis = 0, with this flag, we will
             put it as a whole ndarray in the output. Otherwise 
@@ -260,56 +946,28 @@ def multiprocessor(
         verbose: using textProgBar, it shows the progress of 
             multiprocessing of your task.
             default: False
+        pool: a workerpool to run the batches on, so that the processes
+            are started once for many calls. By default a workerpool is 
+            made for this call and closed at the end.
+        shared_memory: if True, numpy arrays in iterables and outputs are
+            copied once into multiprocessing.shared_memory. Workers slice
+            them without copying, write their results into outputs there
+            and only indices go through the queues. With the fork method
+            of Linux and no pool, the processes have the iterables from 
+            the fork and they are not copied at all. Before Python 3.8,
+            there is no shared_memory and the arrays are pickled with the
+            batches as if it was False. If outputs is a 
+            np.memmap opened with mode 'r+' or 'w+', workers write into
+            its file.
+            default: True
+        prefetch: if iterables is a generator, how many data points are
+            read from it ahead of the workers.
+            default: None, 4 * max_cpu
     """
     # if shareables is not None:
     #     if not isinstance(shareables, tuple):
     #         shareables = (shareables, )
     
-    try:
-        n_pts = int(iterables)
-        assert n_pts == iterables, \
-            'if iterables is a single number, please provide an integer.'
-        iterables = [np_arange(n_pts, dtype='int')]
-    except:
-        try:
-            n_pts = iterables.shape[0]
-            iterables = [iterables]
-        except:
-            try:
-                n_pts = len(iterables[0])
-            except:
-                try:
-                    n_pts = iterables[0].shape[0]
-                except Exception as e:
-                    raise Exception(
-                        'You did not provide iterables properly.'
-                        ' It should be either a list or tuple where all members'
-                        ' have the same length (first dimensions) or it can be'
-                        ' a numpy array to iterate over, or it can be an'
-                        ' integer.'
-                        ) from e
-    indices = np_arange(n_pts, dtype='int')
-    if verbose:
-        logger(f'inputs to iterate over are {n_pts}.')
-
-    if test_mode:
-        logger('TEST mode, uses only 1 CPU')
-
-    if max_cpu is None:
-        max_cpu = cpu_count()
-    default_batchSize = int(np_ceil(n_pts/max_cpu/2))
-    if batchSize is not None:
-        if(default_batchSize >= batchSize):
-            default_batchSize = batchSize
-    if verbose:
-        logger('lognflow multiprocessor initialized with:') 
-        logger('max_cpu: ', max_cpu)
-        logger('n_pts: ', n_pts)
-        logger('default_batchSize: ', default_batchSize)
-        logger('concatenate_outputs: ', concatenate_outputs)
-
-    aQ = Queue()
-
     if outputs is None:
         outputs_is_given = False
         outputs = []
@@ -317,74 +975,19 @@ def multiprocessor(
         outputs_is_given = True
     Q_procID = []
     
-    procID = 0
-    numProcessed = 0
-    numBusyCores = 0
-    if verbose:
-        title = f'Processing {n_pts} data points with {max_cpu} CPUs'
-        if test_mode: title = f'Processing {n_pts} data points with 1 CPU in Test mode'
-        pBar = printprogress(n_pts, title = title)
-    any_error = False
-    
-    error_event = Event()
-    
-    while numProcessed<n_pts:
-        if not aQ.empty():
-            aQElement = aQ.get()
-            ret_procID_range = aQElement[0]
-            ret_result = aQElement[1]
-            if (not any_error) & aQElement[2]:
-                any_error = True
-                error_ret_procID = ret_procID_range.copy()
-                try:
-                    pBar._end()
-                except:
-                    pass
-                logger('lognflow, multiprocessor:')
-                logger('An exception has been raised. Joining all processes...')
-            if not any_error:
-                if(outputs_is_given):
-                    outputs[ret_procID_range] = ret_result
-                    for ret_procID_range_element in ret_procID_range:
-                        Q_procID.append(ret_procID_range_element)
-                else:
-                    for ret_procID, result in zip(ret_procID_range, ret_result):
-                        Q_procID.append(ret_procID)
-                        outputs.append(result)
-            else:
-                logger(f'Number of busy cores: {numBusyCores}')
-
-            _batchSize = ret_procID_range.shape[0]
-            numProcessed += _batchSize
-            numBusyCores -= 1
-            if verbose & (not any_error):
-                pBar(_batchSize)
-            if any_error & (numBusyCores == 0):
-                logger(f'All cores are free')
-                break
-            
-        if (procID<n_pts) & (numBusyCores < max_cpu) & (not any_error):
-            batchSize = np_minimum(default_batchSize, n_pts - procID)
-            procID_range = np_arange(procID, procID + batchSize, dtype = 'int')
-
-            iterables_batch = ()
-            for iim in iterables:
-                iterables_batch = \
-                    iterables_batch + (iim[procID_range], )
-            _args = (iterables_batch, ) + (
-                targetFunction, shareables, aQ, procID_range, error_event)
-            
-            if test_mode:
-                _multiprocessor_function_test_mode(*_args)
-            else:
-                Process(target = _multiprocessor_function, args = _args).start()
-            procID += len(procID_range)
-            numBusyCores += 1
-    
-    if any_error:
-        _reraise_any_error(
-            any_error, targetFunction, error_ret_procID, iterables, 
-            shareables, aQ, error_event, logger)
+    for ret_procID_range, ret_result in _multiprocessor_batches(
+            targetFunction, iterables, shareables, outputs, max_cpu, 
+            batchSize, concatenate_outputs, verbose, test_mode, logger, 
+            pool, shared_memory, prefetch = prefetch):
+        if(outputs_is_given):
+            if ret_result is not None:
+                outputs[ret_procID_range] = ret_result
+            for ret_procID_range_element in ret_procID_range:
+                Q_procID.append(ret_procID_range_element)
+        else:
+            for ret_procID, result in zip(ret_procID_range, ret_result):
+                Q_procID.append(ret_procID)
+                outputs.append(result)
     
     return _prepare_outpus(
         outputs, Q_procID, concatenate_outputs, outputs_is_given)
@@ -399,7 +1002,10 @@ def multiprocessor_gen(
     concatenate_outputs = True,
     verbose             = False,
     test_mode           = False,
-    logger              = print):
+    logger              = print,
+    pool                = None,
+    shared_memory       = True,
+    prefetch            = None):
     """ multiprocessor_gen makes the use of multiprocessing in Python easy
     
         It is exactly the same as multiprocessor, however, it yields the
@@ -407,53 +1013,14 @@ def multiprocessor_gen(
         like a normal generator in a for loop. Look at the above multiprocessor
         for documentation on parameters and look at the tests for 
         multiprocessor_gen for an example how to use a generator in Python.
+        
+        Every yield prepares all outputs that have arrived so far, if you 
+        only need the new ones, multiprocessor_imap is much faster.
     """
     if shareables is not None:
         if not isinstance(shareables, tuple):
             shareables = (shareables, )
     
-    try:
-        n_pts = int(iterables)
-        assert n_pts == iterables, \
-            'if iterables is a single number, please provide an integer.'
-        iterables = [np_arange(n_pts, dtype='int')]
-    except:
-        try:
-            n_pts = iterables.shape[0]
-            iterables = [iterables]
-        except:
-            try:
-                n_pts = len(iterables[0])
-            except:
-                try:
-                    n_pts = iterables[0].shape[0]
-                except Exception as e:
-                    raise Exception(
-                        'You did not provide iterables properly.'
-                        ' It should be either a list or tuple where all members'
-                        ' have the same length (first dimensions) or it can be'
-                        ' a numpy array to iterate over, or it can be an'
-                        ' integer.'
-                        ) from e
-    indices = np_arange(n_pts, dtype='int')
-    if verbose:
-        logger(f'inputs to iterate over are {n_pts}.')
-
-    if(max_cpu is None):
-        max_cpu = cpu_count()
-    default_batchSize = int(np_ceil(n_pts/max_cpu/2))
-    if(batchSize is not None):
-        if(default_batchSize >= batchSize):
-            default_batchSize = batchSize
-    if verbose:
-        logger('lognflow multiprocessor initialized with:') 
-        logger('max_cpu: ', max_cpu)
-        logger('n_pts: ', n_pts)
-        logger('default_batchSize: ', default_batchSize)
-        logger('concatenate_outputs: ', concatenate_outputs)
-
-    aQ = Queue()
-
     if(outputs is None):
         outputs_is_given = False
         outputs = []
@@ -461,78 +1028,80 @@ def multiprocessor_gen(
         outputs_is_given = True
     Q_procID = []
     
-    procID = 0
-    numProcessed = 0
-    numBusyCores = 0
-    if verbose:
-        pBar = printprogress(n_pts, title = 
-            f'Processing {n_pts} data points with {max_cpu} CPUs')
-    any_error = False
-    
-    error_event = Event()
-    
-    while(numProcessed<n_pts):
-        if (not aQ.empty()):
-            aQElement = aQ.get()
-            ret_procID_range = aQElement[0]
-            ret_result = aQElement[1]
-            if ((not any_error) & aQElement[2]):
-                any_error = True
-                error_ret_procID = ret_procID_range.copy()
-                try:
-                    pBar._end()
-                except:
-                    pass
-                logger('lognflow, multiprocessor:')
-                logger('An exception has been raised. Joining all processes...')
-            if (not any_error):
-                if(outputs_is_given):
-                    outputs[ret_procID_range] = ret_result
-                    for ret_procID_range_element in ret_procID_range:
-                        Q_procID.append(ret_procID_range_element)
-                else:
-                    for ret_procID, result in zip(ret_procID_range, ret_result):
-                        Q_procID.append(ret_procID)
-                        outputs.append(result)
-            else:
-                logger(f'Number of busy cores: {numBusyCores}')
+    for ret_procID_range, ret_result in _multiprocessor_batches(
+            targetFunction, iterables, shareables, outputs, max_cpu, 
+            batchSize, concatenate_outputs, verbose, test_mode, logger, 
+            pool, shared_memory, prefetch = prefetch):
+        if(outputs_is_given):
+            if ret_result is not None:
+                outputs[ret_procID_range] = ret_result
+            for ret_procID_range_element in ret_procID_range:
+                Q_procID.append(ret_procID_range_element)
+        else:
+            for ret_procID, result in zip(ret_procID_range, ret_result):
+                Q_procID.append(ret_procID)
+                outputs.append(result)
+        _outputs = _prepare_outpus(
+            outputs, Q_procID, concatenate_outputs, outputs_is_given)
+        yield _outputs, Q_procID
 
-            _batchSize = ret_procID_range.shape[0]
-            numProcessed += _batchSize
-            numBusyCores -= 1
-            if(verbose & (not any_error)):
-                pBar(_batchSize)
-            if(any_error & (numBusyCores == 0)):
-                logger(f'All cores are free')
-                break
-            
-            if(not any_error):
-                _outputs = _prepare_outpus(
-                    outputs, Q_procID, concatenate_outputs, outputs_is_given)
-                yield _outputs, Q_procID
-                
-        if((procID<n_pts) & (numBusyCores < max_cpu) & (not any_error)):
-            batchSize = np_minimum(default_batchSize, n_pts - procID)
-            procID_range = np_arange(procID, procID + batchSize, dtype = 'int')
-
-            iterables_batch = ()
-            for iim in iterables:
-                iterables_batch = \
-                    iterables_batch + (iim[procID_range], )
-            _args = (iterables_batch, ) + (
-                targetFunction, shareables, aQ, procID_range, error_event)
-            
-            if(test_mode):
-                _multiprocessor_function_test_mode(*_args)
-            else:
-                Process(target = _multiprocessor_function, args = _args).start()
-            procID += len(procID_range)
-            numBusyCores += 1
+def multiprocessor_imap(
+    targetFunction,
+    iterables,
+    shareables          = None,
+    max_cpu             = None,
+    batchSize           = None,
+    ordered             = True,
+    max_in_flight       = None,
+    verbose             = False,
+    test_mode           = False,
+    logger              = print,
+    pool                = None,
+    shared_memory       = True,
+    prefetch            = None):
+    """ multiprocessor_imap yields the results of data points one by one
     
-    if(any_error):        
-        _reraise_any_error(
-            any_error, targetFunction, error_ret_procID, iterables, 
-            shareables, aQ, error_event, logger)
+        Like multiprocessor, but it is a generator that yields 
+        (procID, result) for every data point as soon as it can, where 
+        result is what multiprocessor(..., concatenate_outputs = False) 
+        would have at procID. Nothing is gathered or sorted again::
+        
+            for procID, result in multiprocessor_imap(func, data):
+                ...
+        
+        :param ordered:
+            if True, points are yielded in the order of procID. Batches 
+            that arrive early wait in a small buffer until the ones before
+            them arrive. If False, points are yielded as they arrive.
+        :param max_in_flight:
+            the maximum number of points that are sent to the workers or 
+            are waiting in the buffer but are not yielded yet. The 
+            memory for results is bounded by it and batches are made
+            smaller to fit in it. default: None, no limit.
+        
+        Look at multiprocessor for other parameters.
+    """
+    n_yielded = 0
+    next_procID = 0
+    arrived = {}
+    if max_in_flight is not None:
+        max_in_flight = max(int(max_in_flight), 1)
+    for ret_procID_range, ret_result in _multiprocessor_batches(
+            targetFunction, iterables, shareables, None, max_cpu, 
+            batchSize, False, verbose, test_mode, logger, pool, 
+            shared_memory, max_in_flight, lambda: n_yielded, prefetch):
+        if not ordered:
+            for ret_procID, result in zip(ret_procID_range, ret_result):
+                n_yielded += 1
+                yield int(ret_procID), result
+            continue
+        arrived[int(ret_procID_range[0])] = (ret_procID_range, ret_result)
+        while next_procID in arrived:
+            ret_procID_range, ret_result = arrived.pop(next_procID)
+            for ret_procID, result in zip(ret_procID_range, ret_result):
+                n_yielded += 1
+                yield int(ret_procID), result
+            next_procID = int(ret_procID_range[-1]) + 1
 
 def _loopprocessor_function_test_mode(
          targetFunction, theQ, procID_range, error_event, args, kwargs):
@@ -585,6 +1154,7 @@ class loopprocessor:
         self.any_error = False
         self.error_event = Event()
         self.empty_queue = False
+        self.processes = []
     
     def __call__(self, *args, **kwargs):
         if (len(args) == 0) & (len(kwargs) == 0):
@@ -598,9 +1168,11 @@ class loopprocessor:
         single_queue_access = True
         while(single_queue_access | release_a_cpu | self.empty_queue):
             single_queue_access = False
-        
-            if (not self.aQ.empty()):
-                aQElement = self.aQ.get()
+            
+            block = ((release_a_cpu | self.empty_queue) 
+                     & (self.numProcessed < self.procID))
+            aQElement = _get_from_queue(self.aQ, block, self.processes)
+            if aQElement is not None:
                 ret_procID_range = aQElement[0]
                 ret_result = aQElement[1]
                 if ((not self.any_error) & aQElement[2]):
@@ -642,8 +1214,12 @@ class loopprocessor:
                 if(self.test_mode):
                     _loopprocessor_function_test_mode(*_args)
                 else:
-                    Process(target = _loopprocessor_function, 
-                            args = _args).start()
+                    proc = Process(target = _loopprocessor_function, 
+                                   args = _args)
+                    proc.start()
+                    self.processes = [
+                        _ for _ in self.processes if _.exitcode != 0]
+                    self.processes.append(proc)
                 self.procID += 1
                 self.numBusyCores += 1
     
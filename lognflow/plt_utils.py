@@ -7,8 +7,10 @@ from   matplotlib.colors import hsv_to_rgb
 from   matplotlib.widgets import RangeSlider, TextBox, Button, Slider, CheckButtons
 from   mpl_toolkits.mplot3d import Axes3D
 from   mpl_toolkits.axes_grid1 import make_axes_locatable
+from   itertools import chain as itertools_chain
 from   itertools import cycle as itertools_cycle
 from   itertools import product as itertools_product
+from   pathlib import Path as pathlib_Path
 from   lognflow.utils import has_len
 
 matplotlib_lines_Line2D_markers_keys_cycle = itertools_cycle([
@@ -25,23 +27,31 @@ def label_connected_same_values(image, ignore_value=None):
     """
     Label all connected regions in an image where pixels have the same value.
 
+    Neighbouring pixels, along rows or columns, with equal values are the
+    edges of a sparse graph and its connected components are the regions,
+    so there is no loop over values or regions. Sizes and centers come
+    from np.bincount over the labels. Regions are numbered by their value
+    and then by their first pixel.
+
     Parameters
     ----------
     image : ndarray
         2D array (integer or binary image) where regions of identical values
         form connected components.
     ignore_value : int, optional
-        Pixel value to ignore (e.g., background = 0).
+        Pixel value to ignore (e.g., background = 0). NaNs are ignored too.
 
     Returns
     -------
     labeled : ndarray of int
-        Image of same shape as input, where each connected region has a unique label.
-    centers : list of tuple of int
-        (row, col) integer coordinates for the approximate center pixel of each region.
-    values : list of int
+        Image of same shape as input, where each connected region has a 
+        unique label starting from 1, ignored pixels are 0.
+    centers : ndarray of int
+        n_regions x 2, (row, col) coordinates of the pixel nearest to the 
+        center of mass of each region.
+    values : ndarray
         Original pixel values corresponding to each labeled region.
-    sizes : list of int
+    sizes : ndarray of int
         Number of pixels (area) in each connected region.
 
     Examples
@@ -53,50 +63,59 @@ def label_connected_same_values(image, ignore_value=None):
     ...     [3, 3, 3, 0, 0]
     ... ])
     >>> labeled, centers, values, sizes = label_connected_same_values(img, ignore_value=0)
-    >>> print("Centers:", centers)
-    Centers: [(0, 0), (0, 3), (2, 1)]
-    >>> print("Sizes:", sizes)
+    >>> print("Centers:", centers.tolist())
+    Centers: [[0, 0], [0, 3], [2, 1]]
+    >>> print("Sizes:", sizes.tolist())
     Sizes: [3, 3, 3]
     """
-    import scipy.ndimage
-    
-    labeled = np.zeros_like(image, dtype=int)
-    centers = []
-    values = []
-    sizes = []
-    label_counter = 1
-    unique_vals = np.unique(image)
-    if len(unique_vals) < 0.5 * image.size:
-        for val in unique_vals:
-            if ignore_value is not None:
-                if val == ignore_value:
-                    continue
-    
-            mask = image == val
-            labels, n = scipy.ndimage.label(mask)
-            if n == 0:
-                continue
-    
-            labeled[mask] = labels[mask] + label_counter - 1
-    
-            for k in range(1, n + 1):
-                # Compute centroid in (row, col) coordinates
-                center = scipy.ndimage.center_of_mass(mask, labels, k)
-                center_int = tuple(map(int, np.round(center)))  # nearest pixel
-    
-                # Compute region size (number of pixels)
-                size = np.sum(labels == k)
-    
-                centers.append(center_int)
-                values.append(val)
-                sizes.append(size)
-    
-            label_counter += n
-    else:
-        labeled = np.arange(1, 1 + image.size, dtype=int).reshape(image.shape)
-        centers = np.stack(np.indices(image.shape), axis=-1).reshape(-1, 2)
-        values = image.ravel()
-        sizes = np.ones(image.size)
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    image = np.asarray(image)
+    n_pix = image.size
+    valid = np.ones(image.shape, dtype=bool)
+    if image.dtype.kind in 'fc':
+        valid &= image == image
+    if ignore_value is not None:
+        valid &= image != ignore_value
+
+    pixel_inds = np.arange(n_pix).reshape(image.shape)
+    heads = []
+    tails = []
+    for axis in range(image.ndim):
+        slc_a = [slice(None)] * image.ndim
+        slc_b = [slice(None)] * image.ndim
+        slc_a[axis] = slice(None, -1)
+        slc_b[axis] = slice(1, None)
+        slc_a, slc_b = tuple(slc_a), tuple(slc_b)
+        same = (image[slc_a] == image[slc_b]) & valid[slc_a]
+        heads.append(pixel_inds[slc_a][same])
+        tails.append(pixel_inds[slc_b][same])
+    heads = np.concatenate(heads)
+    tails = np.concatenate(tails)
+    graph = coo_matrix((np.ones(len(heads), dtype=bool), (heads, tails)),
+                       shape=(n_pix, n_pix))
+    n_comp, comp = connected_components(graph, directed=False)
+
+    _, first_pixel = np.unique(comp, return_index=True)
+    first_pixel = first_pixel[valid.ravel()[first_pixel]]
+    comp_values = image.ravel()[first_pixel]
+    order = np.lexsort((first_pixel, comp_values))
+    first_pixel = first_pixel[order]
+    n_regions = len(first_pixel)
+
+    new_label = np.zeros(n_comp, dtype=int)
+    new_label[comp[first_pixel]] = np.arange(1, n_regions + 1)
+    labeled = new_label[comp]
+
+    sizes = np.bincount(labeled, minlength=n_regions + 1)[1:]
+    coords = np.unravel_index(np.arange(n_pix), image.shape)
+    centers = np.array(
+        [np.bincount(labeled, weights=coord, minlength=n_regions + 1)[1:]
+         for coord in coords]).T / np.maximum(sizes, 1)[:, None]
+    centers = np.round(centers).astype(int)
+    values = image.ravel()[first_pixel]
+    labeled = labeled.reshape(image.shape)
 
     return labeled, centers, values, sizes
 
@@ -171,7 +190,565 @@ def complex2hsv(data_complex, vmin=None, vmax=None):
 
     return hsv_to_rgb(H), data_abs, data_angle
 
-def stack_to_frame(stack, frame_shape : tuple = None, borders = 0):
+_colormap_luts = {}
+
+def colormap_lut(cmap = 'viridis', n_colors = 256):
+    """ colors of a colormap as a n_colors x 3 table of uint8
+        Tables of colormaps given by name are made once and kept.
+    """
+    key = (cmap, n_colors) if isinstance(cmap, str) else None
+    lut = _colormap_luts.get(key, None)
+    if lut is None:
+        import matplotlib
+        if isinstance(cmap, str):
+            cmap = matplotlib.colormaps[cmap]
+        lut = cmap(np.linspace(0, 1, n_colors))[:, :3]
+        lut = (lut * 255 + 0.5).astype('uint8')
+        if key is not None:
+            _colormap_luts[key] = lut
+    return lut
+
+def colormap_indices(img, vmin = None, vmax = None, n_colors = 256):
+    """ indices of the pixels of a 2D image in a colormap table
+        The image is normalized between vmin and vmax to the indices of a
+        table of n_colors, see colormap_lut. The indices are clipped,
+        NaNs get 0 and infinities get the ends of the table. They are
+        mapped before the cast, as casting NaN to int is not defined.
+    """
+    if vmin is None: vmin = np.nanmin(img)
+    if vmax is None: vmax = np.nanmax(img)
+    scale = (n_colors - 1) / (vmax - vmin) if vmax > vmin else 0
+    with np.errstate(invalid = 'ignore'):
+        inds = (img - vmin) * scale
+    inds = np.nan_to_num(inds, copy = False, nan = 0, 
+                         posinf = n_colors - 1, neginf = 0)
+    np.clip(inds, 0, n_colors - 1, out = inds)
+    return inds.astype(np.intp)
+
+def apply_colormap(img, cmap = 'viridis', vmin = None, vmax = None,
+                   colorbar = False, n_colors = 256):
+    """ turn an image into a uint8 RGB image without making a figure
+        A 2D image is normalized between vmin and vmax and its colors are
+        taken from the table of the colormap. An RGB image, n x m x 3, is
+        scaled from vmin and vmax to uint8, by default like plt.imshow,
+        0 to 1 for floats and 0 to 255 for integers. NaNs get the color 
+        of vmin.
+
+        :param img: np.ndarray
+            n x m or n x m x 3
+        :param colorbar: bool
+            if True, a strip with the colors from vmin at the bottom to
+            vmax at the top is put on the right side of the image.
+        :return: n x m x 3 uint8 np.ndarray
+    """
+    img = np.asarray(img)
+    if img.ndim == 3:
+        if (img.dtype == np.uint8) & (vmin is None) & (vmax is None):
+            return img
+        if vmin is None: vmin = 0
+        if vmax is None: vmax = 1 if img.dtype.kind == 'f' else 255
+        with np.errstate(invalid = 'ignore'):
+            rgb = (img - vmin) * (255 / (vmax - vmin) if vmax > vmin else 0)
+        return np.clip(np.nan_to_num(rgb), 0, 255).astype('uint8')
+
+    lut = colormap_lut('viridis' if cmap is None else cmap, n_colors)
+    rgb = lut.take(colormap_indices(img, vmin = vmin, vmax = vmax, 
+                                    n_colors = n_colors), axis = 0)
+    if colorbar:
+        n_r, n_c = img.shape
+        gap = max(2, n_c // 50)
+        width = max(4, n_c // 20)
+        frame = np.full((n_r, n_c + gap + width, 3), 255, dtype = 'uint8')
+        frame[:, :n_c] = rgb
+        strip = np.linspace(n_colors - 1, 0, n_r).astype(np.intp)
+        frame[:, n_c + gap:] = lut[strip][:, None]
+        rgb = frame
+    return rgb
+
+def imsave_fast(fpath, img, cmap = 'viridis', vmin = None, vmax = None,
+                colorbar = False, image_format = None, quality = 90):
+    """ save an image with a colormap straight through PIL
+        This is apply_colormap followed by PIL, so it is a lot faster than
+        plt_imshow and savefig. If colorbar is True, vmin and vmax are
+        written next to the color strip.
+
+        :param image_format: str
+            jpg, png or anything PIL writes. By default the suffix of fpath.
+        :param quality: int
+            quality of JPEG images
+    """
+    from PIL import Image, ImageDraw
+    img = np.asarray(img)
+    colorbar = colorbar & (img.ndim == 2)
+    if img.ndim == 2:
+        if vmin is None: vmin = np.nanmin(img)
+        if vmax is None: vmax = np.nanmax(img)
+    rgb = apply_colormap(img, cmap = cmap, vmin = vmin, vmax = vmax,
+                         colorbar = colorbar)
+    pil_img = Image.fromarray(rgb)
+    if colorbar:
+        labels = [f'{vmax:.3g}', f'{vmin:.3g}']
+        draw = ImageDraw.Draw(pil_img)
+        bboxes = [draw.textbbox((0, 0), _) for _ in labels]
+        text_width = max([_[2] for _ in bboxes]) + 2
+        text_height = max([_[3] for _ in bboxes])
+        if rgb.shape[0] >= 2 * text_height:
+            canvas = Image.new('RGB', (rgb.shape[1] + text_width,
+                                       rgb.shape[0]), (255, 255, 255))
+            canvas.paste(pil_img, (0, 0))
+            draw = ImageDraw.Draw(canvas)
+            draw.text((rgb.shape[1] + 2, 0), labels[0], fill = (0, 0, 0))
+            draw.text((rgb.shape[1] + 2, rgb.shape[0] - text_height),
+                      labels[1], fill = (0, 0, 0))
+            pil_img = canvas
+    if image_format is None:
+        image_format = str(fpath).split('.')[-1]
+    image_format = image_format.lower()
+    if image_format in ('jpg', 'jpeg'):
+        pil_img.save(fpath, format = 'JPEG', quality = quality)
+    else:
+        pil_img.save(fpath, format = image_format.upper())
+    return fpath
+
+def _frame_layout(stack_shape, frame_shape = None):
+    """ where the images of a stack go in the frame of stack_to_frame
+        returns the shape of the grid, the size of the tiles with borders,
+        whether it is RGB and the grid rows and columns that get an image.
+    """
+    is_rgb = stack_shape[-1] == 3
+    if(len(stack_shape) == 4):
+        if((stack_shape[2] == 3) & (stack_shape[3] == 1)):
+            stack_shape = stack_shape[:3]
+    
+    n_im, n_R, n_C = stack_shape[:3]
+        
+    if(len(stack_shape) == 4):
+        assert is_rgb, 'For a stack of images with axis 3, it should be 1 or 3.'
+
+    assert (len(stack_shape) == 3) | (len(stack_shape) == 4), \
+        f'The stack you provided can have specific shapes. it is {stack_shape}'
+
+    if(frame_shape is None):
+        square_side = int(np.ceil(np.sqrt(n_im)))
+        frame_n_r, frame_n_c = (square_side, square_side)
+    else:
+        frame_n_r, frame_n_c = frame_shape
+    rcnt, ccnt = np.meshgrid(np.arange(frame_n_r), np.arange(frame_n_c),
+                             indexing = 'ij')
+    rows, clms = np.nonzero(rcnt + frame_n_c * ccnt < n_im)
+    rows, clms = rows[:n_im], clms[:n_im]
+    return frame_n_r, frame_n_c, n_R + 2, n_C + 2, is_rgb, rows, clms
+
+def _gif_image_block(data):
+    """ the color table and the image block of a single frame GIF file
+        returns the left, top, width and height bytes of the image 
+        descriptor, the color table, its size bits with the interlace flag
+        and the LZW data with its sub-blocks.
+    """
+    packed = data[10]
+    pos = 13
+    color_table, size_bits = b'', 0
+    if packed & 0x80:
+        size_bits = packed & 0x07
+        color_table = data[pos: pos + 3 * 2 ** (size_bits + 1)]
+        pos += len(color_table)
+    while data[pos] == 0x21:
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    assert data[pos] == 0x2C, 'lognflow: could not read the GIF frame.'
+    position_size = data[pos + 1: pos + 9]
+    packed = data[pos + 9]
+    pos += 10
+    if packed & 0x80:
+        size_bits = packed & 0x07
+        color_table = data[pos: pos + 3 * 2 ** (size_bits + 1)]
+        pos += len(color_table)
+    size_bits |= packed & 0x40
+    start = pos
+    pos += 1
+    while data[pos]:
+        pos += data[pos] + 1
+    return position_size, color_table, size_bits, data[start: pos + 1]
+
+class gifwriter:
+    """ Streaming GIF writer
+        Frames are appended one at a time and written to the file right 
+        away, so the memory does not grow with the number of frames. PIL 
+        encodes each frame as a GIF of its own and its image block is 
+        copied into the file with its own color table.
+
+        2D frames get the colors of cmap through colormap_indices, so the
+        palette is the colormap itself and no quantization is needed. RGB
+        frames, n_r x n_c x 3, are quantized to 256 colors.
+
+        :param fpath: path of the GIF file
+        :param interval: the time between frames in milliseconds
+        :param vmin, vmax: range of the colormap, by default the range 
+            of every frame. Like plt.imshow, RGB frames do not use them.
+        :param zoom: int, every pixel becomes zoom x zoom pixels
+        :param repeat_delay: milliseconds to wait at the last frame
+        :param loop: number of times to play, 0 for ever
+    """
+    def __init__(self, fpath, interval = 50, cmap = 'viridis', 
+                 vmin = None, vmax = None, zoom = 1, repeat_delay = None,
+                 loop = 0):
+        self.fpath = fpath
+        self.delay = int(round(interval / 10))
+        self.cmap = cmap
+        self.vmin = vmin
+        self.vmax = vmax
+        self.zoom = int(zoom)
+        self.repeat_delay = repeat_delay
+        self.loop = loop
+        self.shape = None
+        self.n_frames = 0
+        self._pending = None
+        self._file = open(fpath, 'wb')
+
+    def _encode(self, frame):
+        from io import BytesIO
+        from PIL import Image
+        frame = np.asarray(frame)
+        if self.zoom > 1:
+            frame = frame.repeat(self.zoom, 0).repeat(self.zoom, 1)
+        if frame.ndim == 2:
+            inds = colormap_indices(frame, vmin = self.vmin, vmax = self.vmax)
+            pil_img = Image.fromarray(inds.astype(np.uint8)).convert('P')
+            pil_img.putpalette(colormap_lut(self.cmap).tobytes())
+        else:
+            pil_img = Image.fromarray(apply_colormap(frame)).quantize(256)
+        buf = BytesIO()
+        pil_img.save(buf, format = 'GIF', interlace = False)
+        return frame.shape[:2], _gif_image_block(buf.getvalue())
+
+    def _write_frame(self, block, delay):
+        position_size, color_table, size_bits, image_data = block
+        self._file.write(b'\x21\xF9\x04\x04' 
+                         + int(delay).to_bytes(2, 'little') + b'\x00\x00')
+        self._file.write(b'\x2C' + position_size 
+                         + bytes([0x80 | size_bits]) + color_table)
+        self._file.write(image_data)
+
+    def append(self, frame):
+        shape, block = self._encode(frame)
+        if self.shape is None:
+            self.shape = shape
+            n_r, n_c = shape
+            self._file.write(b'GIF89a' + n_c.to_bytes(2, 'little')
+                             + n_r.to_bytes(2, 'little') + b'\x00\x00\x00')
+            self._file.write(b'\x21\xFF\x0BNETSCAPE2.0\x03\x01' 
+                             + int(self.loop).to_bytes(2, 'little') + b'\x00')
+        assert shape == self.shape, \
+            f'lognflow.gifwriter: frame shape {shape} is not {self.shape}.'
+        if self._pending is not None:
+            self._write_frame(self._pending, self.delay)
+        self._pending = block
+        self.n_frames += 1
+
+    def close(self):
+        """ write the last frame and the trailer of the file
+            A GIF needs at least one frame, if none was appended the file
+            is removed and ValueError is raised.
+        """
+        if self._file.closed:
+            return
+        if self.n_frames == 0:
+            self._file.close()
+            try:
+                pathlib_Path(self.fpath).unlink()
+            except FileNotFoundError:
+                pass
+            raise ValueError(
+                f'lognflow.gifwriter: no frames were appended to {self.fpath}.')
+        if self._pending is not None:
+            delay = self.delay
+            if self.repeat_delay is not None:
+                delay += int(round(self.repeat_delay / 10))
+            self._write_frame(self._pending, delay)
+            self._pending = None
+        self._file.write(b'\x3B')
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        try:
+            self.close()
+        except ValueError:
+            # the error that stopped the frames is more useful
+            if exc_type is None:
+                raise
+
+class mp4writer:
+    """ Streaming MP4 writer
+        Frames are colormapped with apply_colormap and piped as raw RGB
+        to ffmpeg, one at a time. ffmpeg must be on the PATH or 
+        imageio_ffmpeg must be installed. Odd sizes are padded to be even.
+
+        :param fpath: path of the MP4 file
+        :param interval: the time between frames in milliseconds
+        :param vmin, vmax: range of the colormap, by default the range 
+            of every frame.
+        :param zoom: int, every pixel becomes zoom x zoom pixels
+        :param crf: quality of libx264, lower is better.
+    """
+    def __init__(self, fpath, interval = 50, cmap = 'viridis', 
+                 vmin = None, vmax = None, zoom = 1, crf = 23):
+        import shutil
+        self.ffmpeg = shutil.which('ffmpeg')
+        if self.ffmpeg is None:
+            try:
+                from imageio_ffmpeg import get_ffmpeg_exe
+                self.ffmpeg = get_ffmpeg_exe()
+            except ImportError:
+                raise RuntimeError('lognflow.mp4writer needs ffmpeg on the'
+                                   ' PATH or imageio_ffmpeg installed.')
+        self.fpath = fpath
+        self.fps = 1000 / interval
+        self.cmap = cmap
+        self.vmin = vmin
+        self.vmax = vmax
+        self.zoom = int(zoom)
+        self.crf = crf
+        self.shape = None
+        self.n_frames = 0
+        self._proc = None
+
+    def append(self, frame):
+        import subprocess
+        frame = np.asarray(frame)
+        if self.zoom > 1:
+            frame = frame.repeat(self.zoom, 0).repeat(self.zoom, 1)
+        if frame.ndim == 2:
+            rgb = apply_colormap(frame, cmap = self.cmap, 
+                                 vmin = self.vmin, vmax = self.vmax)
+        else:
+            rgb = apply_colormap(frame)
+        n_r, n_c = rgb.shape[:2]
+        if (n_r % 2) | (n_c % 2):
+            rgb = np.pad(rgb, ((0, n_r % 2), (0, n_c % 2), (0, 0)), 
+                         mode = 'edge')
+        if self._proc is None:
+            self.shape = rgb.shape
+            self._proc = subprocess.Popen(
+                [self.ffmpeg, '-y', '-loglevel', 'error',
+                 '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                 '-s', f'{rgb.shape[1]}x{rgb.shape[0]}', 
+                 '-r', f'{self.fps}', '-i', '-',
+                 '-vcodec', 'libx264', '-pix_fmt', 'yuv420p',
+                 '-crf', f'{self.crf}', str(self.fpath)],
+                stdin = subprocess.PIPE, stderr = subprocess.PIPE)
+        assert rgb.shape == self.shape, \
+            f'lognflow.mp4writer: frame shape {rgb.shape} is not {self.shape}.'
+        self._proc.stdin.write(np.ascontiguousarray(rgb).tobytes())
+        self.n_frames += 1
+
+    def close(self):
+        if self._proc is None:
+            return
+        self._proc.stdin.close()
+        err = self._proc.stderr.read()
+        self._proc.wait()
+        returncode = self._proc.returncode
+        self._proc = None
+        if returncode != 0:
+            raise RuntimeError(f'lognflow.mp4writer: ffmpeg failed: '
+                               f'{err.decode(errors = "ignore")}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def _zoom_for_dpi(frame_shape, dpi):
+    """ the zoom that makes a frame about as large as plt.imshow shows it 
+        on a default figure saved with dpi
+    """
+    rc = plt.rcParams
+    fig_w, fig_h = rc['figure.figsize']
+    ax_w = fig_w * dpi * (rc['figure.subplot.right'] - rc['figure.subplot.left'])
+    ax_h = fig_h * dpi * (rc['figure.subplot.top'] - rc['figure.subplot.bottom'])
+    n_r, n_c = frame_shape[:2]
+    return max(1, int(min(ax_w / n_c, ax_h / n_r)))
+
+def save_animation(fpath, frames, interval = 50, cmap = 'viridis',
+                   vmin = None, vmax = None, zoom = None, repeat_delay = None,
+                   dpi = 100):
+    """ write frames into a GIF or an MP4 file, one frame at a time
+        frames can be anything that gives 2D or RGB frames when iterated,
+        e.g. a generator, a memory mapped stack or a lazystack. The file
+        type is chosen by the suffix of fpath.
+        
+        :param zoom: int, every pixel becomes zoom x zoom pixels. If None,
+            it is chosen from the first frame so that the frames are about
+            as large as on a default figure saved with dpi.
+        :return: number of frames written
+    """
+    if zoom is None:
+        frames = iter(frames)
+        try:
+            first_frame = next(frames)
+            zoom = _zoom_for_dpi(np.shape(first_frame), dpi)
+            frames = itertools_chain([first_frame], frames)
+        except StopIteration:
+            zoom = 1
+    if str(fpath).lower().endswith('.mp4'):
+        writer = mp4writer(fpath, interval = interval, cmap = cmap, 
+                           vmin = vmin, vmax = vmax, zoom = zoom)
+    else:
+        writer = gifwriter(fpath, interval = interval, cmap = cmap, 
+                           vmin = vmin, vmax = vmax, zoom = zoom,
+                           repeat_delay = repeat_delay)
+    with writer:
+        for frame in frames:
+            writer.append(frame)
+    return writer.n_frames
+
+class pdfwriter:
+    """ Streaming PDF writer
+        Every frame becomes one page and is written to the file right 
+        away, so the memory does not grow with the number of pages. Pages
+        are JPEG images, DCTDecode in the PDF, like the PDFs made by PIL.
+        Only the offsets of the objects are kept to write the table of
+        the file at close.
+
+        A frame can be a uint8 2D or RGB image, a PIL image, or the path 
+        of an image file. JPEG files are put in the PDF as they are, 
+        without decoding them. Other 2D frames get the colors of cmap by 
+        apply_colormap.
+
+        :param fpath: path of the PDF file
+        :param dpi: resolution of the pages, the page is n_c / dpi inches
+            wide.
+        :param quality: quality of the JPEG pages
+        :param info: title, author, subject, keywords, creator, ...
+            go into the document information of the PDF.
+    """
+    def __init__(self, fpath, dpi = 1200, quality = 75, cmap = 'viridis', 
+                 vmin = None, vmax = None, **info):
+        self.fpath = fpath
+        self.dpi = dpi
+        self.quality = quality
+        self.cmap = cmap
+        self.vmin = vmin
+        self.vmax = vmax
+        self.info = info
+        self.n_frames = 0
+        self._offsets = {}
+        self._page_ids = []
+        self._next_id = 4 # 1: catalog, 2: pages, 3: info
+        self._file = open(fpath, 'wb')
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write_object(self, obj_id, body, stream = None):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % obj_id + body)
+        if stream is not None:
+            self._file.write(b'\nstream\n' + stream + b'\nendstream')
+        self._file.write(b'\nendobj\n')
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id - 1
+
+    def _encode(self, frame):
+        from io import BytesIO
+        from PIL import Image
+        if isinstance(frame, (str, pathlib_Path)):
+            with Image.open(frame) as pil_img:
+                if ((pil_img.format == 'JPEG') 
+                    & (pil_img.mode in ('L', 'RGB'))):
+                    with open(frame, 'rb') as fp:
+                        return pil_img.size, pil_img.mode, fp.read()
+                pil_img.load()
+        elif isinstance(frame, Image.Image):
+            pil_img = frame
+        else:
+            frame = np.asarray(frame)
+            if (frame.ndim == 3) & (frame.shape[-1] == 4):
+                frame = frame[..., :3]
+            if (frame.ndim == 2) & (frame.dtype == np.uint8):
+                pil_img = Image.fromarray(frame)
+            else:
+                pil_img = Image.fromarray(apply_colormap(
+                    frame, cmap = self.cmap, vmin = self.vmin, 
+                    vmax = self.vmax))
+        if pil_img.mode not in ('L', 'RGB'):
+            pil_img = pil_img.convert('RGB')
+        buf = BytesIO()
+        pil_img.save(buf, format = 'JPEG', quality = self.quality)
+        return pil_img.size, pil_img.mode, buf.getvalue()
+
+    def append(self, frame):
+        (n_c, n_r), mode, jpeg_data = self._encode(frame)
+        width = n_c * 72.0 / self.dpi
+        height = n_r * 72.0 / self.dpi
+        colorspace = b'/DeviceGray' if mode == 'L' else b'/DeviceRGB'
+        image_id, content_id, page_id = \
+            self._new_id(), self._new_id(), self._new_id()
+        self._write_object(image_id, 
+            b'<< /Type /XObject /Subtype /Image /Width %d /Height %d '
+            b'/ColorSpace %s /BitsPerComponent 8 /Filter /DCTDecode '
+            b'/Length %d >>' % (n_c, n_r, colorspace, len(jpeg_data)),
+            jpeg_data)
+        content = b'q %f 0 0 %f 0 0 cm /image Do Q' % (width, height)
+        self._write_object(content_id, 
+            b'<< /Length %d >>' % len(content), content)
+        self._write_object(page_id, 
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %f %f] '
+            b'/Resources << /XObject << /image %d 0 R >> >> '
+            b'/Contents %d 0 R >>' % (width, height, image_id, content_id))
+        self._page_ids.append(page_id)
+        self.n_frames += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        kids = b' '.join([b'%d 0 R' % _ for _ in self._page_ids])
+        self._write_object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' 
+                           % (kids, len(self._page_ids)))
+        info = b''.join(
+            [b'/%s <%s> ' % (key[0].upper().encode() + key[1:].encode(),
+                             ('\ufeff' + str(value)).encode('utf-16-be').hex()
+                             .encode())
+             for key, value in self.info.items()])
+        self._write_object(3, b'<< %s>>' % info)
+        xref_offset = self._file.tell()
+        n_objects = self._next_id
+        self._file.write(b'xref\n0 %d\n0000000000 65535 f \n' % n_objects)
+        self._file.write(b''.join([b'%010d 00000 n \n' % self._offsets[_] 
+                                   for _ in range(1, n_objects)]))
+        self._file.write(b'trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\n'
+                         b'startxref\n%d\n%%%%EOF\n' 
+                         % (n_objects, xref_offset))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def save_pdf(fpath, frames, dpi = 1200, quality = 75, **info):
+    """ write frames into a PDF file, one page at a time
+        frames can be anything that gives images or paths of image files
+        when iterated, e.g. a generator, a memory mapped stack or a 
+        lazystack. See pdfwriter.
+        
+        :return: number of pages written
+    """
+    with pdfwriter(fpath, dpi = dpi, quality = quality, **info) as writer:
+        for frame in frames:
+            writer.append(frame)
+    return writer.n_frames
+
+def stack_to_frame(stack, frame_shape : tuple = None, borders = 0,
+                   out = None):
     """ turn a stack of images into a 2D frame of images
         This is very useful when lots of images need to be tiled
         against each other.
@@ -195,6 +772,9 @@ def stack_to_frame(stack, frame_shape : tuple = None, borders = 0):
             When plotting images with matplotlib.pyplot.imshow, there
             needs to be a border between them. This is the value for the 
             border elements.
+        :param out: np.ndarray
+            a C-contiguous array with the shape of the output to write the
+            frame into, e.g. to reuse it for every frame of a video.
             
         output
         ---------
@@ -203,60 +783,66 @@ def stack_to_frame(stack, frame_shape : tuple = None, borders = 0):
             it produces an np.array of shape n_f x n_r * f_r x n_c * f_c or
             n_f x n_r * f_r x n_c * f_c x 3 in case of an RGB input.
     """
-    is_rgb = stack.shape[-1] == 3
-    
-    if(len(stack.shape) == 4):
-        if((stack.shape[2] == 3) & (stack.shape[3] == 1)):
-            stack = stack[..., 0]
-    
-    n_im, n_R, n_C = stack.shape[:3]
-        
-    if(len(stack.shape) == 4):
-        assert is_rgb, 'For a stack of images with axis 3, it should be 1 or 3.'
-
-    assert (len(stack.shape) == 3) | (len(stack.shape) == 4), \
-        f'The stack you provided can have specific shapes. it is {stack.shape}'
-
-    if(frame_shape is None):
-        square_side = int(np.ceil(np.sqrt(n_im)))
-        frame_n_r, frame_n_c = (square_side, square_side)
-    else:
-        frame_n_r, frame_n_c = frame_shape
-    n_R += 2
-    n_C += 2
-    new_n_R = n_R * frame_n_r
-    new_n_C = n_C * frame_n_c
+    frames = _stacks_to_frames(stack[None], frame_shape = frame_shape,
+                               borders = borders,
+                               out = None if out is None else out[None])
+    return frames[0] if out is None else out
 
-    if is_rgb:
-        frame = np.zeros((new_n_R, new_n_C, 3), dtype = stack.dtype)
-    else:
-        frame = np.zeros((new_n_R, new_n_C), dtype = stack.dtype)
-    used_ch_cnt = 0
-    if(borders is not None):
-        frame += borders
-    for rcnt in range(frame_n_r):
-        for ccnt in range(frame_n_c):
-            ch_cnt = rcnt + frame_n_c*ccnt
-            if (ch_cnt<n_im):
-                frame[rcnt*n_R + 1: (rcnt + 1)*n_R - 1,
-                      ccnt*n_C + 1: (ccnt + 1)*n_C - 1] = \
-                    stack[used_ch_cnt]
-                used_ch_cnt += 1
-    return frame
-
-def stacks_to_frames(stack_list, frame_shape : tuple = None, borders = 0):
+def stacks_to_frames(stack_list, frame_shape : tuple = None, borders = 0,
+                     out = None):
     """ turn a list of stack of images into a list of frame of images
-        This is simply a list of calling stack_to_frame
+        This is the same as calling stack_to_frame for every stack
+        but all frames are made at once.
         :param stack_list:
             It must have the shape of either
             n_f x n_im x n_r x n_c
             n_f x n_im x n_r x  3  x 1
             n_f x n_im x n_r x n_c x 3
+        :param out: np.ndarray
+            a C-contiguous array with the shape of the output to write the
+            frames into.
 
-    """    
-    return np.array([stack_to_frame(stack, 
-                                    frame_shape = frame_shape, 
-                                    borders = borders) for stack in stack_list])
+    """
+    try:
+        stacks = np.asarray(stack_list)
+        assert stacks.dtype != object
+    except:
+        return np.array([stack_to_frame(stack, 
+                                        frame_shape = frame_shape, 
+                                        borders = borders) 
+                         for stack in stack_list])
+    return _stacks_to_frames(stacks, frame_shape = frame_shape,
+                             borders = borders, out = out)
+
+def _stacks_to_frames(stacks, frame_shape = None, borders = 0, out = None):
+    frame_n_r, frame_n_c, n_R, n_C, is_rgb, rows, clms = \
+        _frame_layout(stacks.shape[1:], frame_shape)
+    if((stacks.ndim == 5) & (stacks.shape[-1] == 1)):
+        stacks = stacks[..., 0]
+    n_f = stacks.shape[0]
+    frame_shape_out = (n_f, n_R * frame_n_r, n_C * frame_n_c)
+    if is_rgb:
+        frame_shape_out += (3,)
+    if out is None:
+        out = np.zeros(frame_shape_out, dtype = stacks.dtype)
+    else:
+        assert out.shape == frame_shape_out, \
+            f'out has the shape {out.shape}, it should be {frame_shape_out}'
+    if(borders is not None):
+        out[...] = borders
+    else:
+        out[...] = 0
+
+    # every tile of the frame is a view of out, one copy fills them all
+    tiles = out.reshape(n_f, frame_n_r, n_R, frame_n_c, n_C,
+                        *frame_shape_out[3:]).swapaxes(2, 3)
+    assert np.shares_memory(tiles, out), 'out must be C-contiguous.'
+    if len(rows) == frame_n_r * frame_n_c:
+        tiles[:, :, :, 1:-1, 1:-1] = stacks[:, :len(rows)].reshape(
+            n_f, frame_n_r, frame_n_c, *stacks.shape[2:])
+    else:
+        tiles[:, rows, clms, 1:-1, 1:-1] = stacks[:, :len(rows)]
+    return out
 
 def plt_hist2(data, bins=30, cmap='viridis', use_bars = False, function_on_z = None,
               xlabel=None, ylabel=None, zlabel=None, title=None, 
@@ -1510,12 +2096,13 @@ def plt_scatter3(
         pass
 
     if make_animation:
-        stack = []
-        for elev in elev_list:
-            for azim in azim_list:
-                ax.view_init(elev=elev, azim=azim)
-                img = plt_fig_to_numpy_3ch(fig)
-                stack.append(img)
+        def _views():
+            for elev in elev_list:
+                for azim in azim_list:
+                    ax.view_init(elev=elev, azim=azim)
+                    yield fig
+        stack = plt_figs_to_numpy(
+            _views(), n_frames = len(elev_list) * len(azim_list))
         return fig, ax, stack
     else:
         elev = None if elev_list is None else elev_list[0]
@@ -1544,24 +2131,79 @@ def plt_surface(stack, fig_ax = None, **kwargs):
     ax.plot_surface(X, Y, stack, **kwargs)
     return fig, ax
 
-def plt_fig_to_numpy_3ch(fig):
-    """Convert a matplotlib figure to a numpy 2D array (RGB)."""
-    fig.canvas.draw()
-    w, h = fig.canvas.get_width_height()
-    buf = np.frombuffer(fig.canvas.tostring_argb(), dtype=np.uint8)
-    buf.shape = (h, w, 4)  # Shape should be (height, width, 4) for RGBA
-    buf = np.copy(buf)  # Ensure we have a copy, not a view
-    return buf
-
-def plt_fig_to_numpy(fig):
-    """ from https://www.icare.univ-lille.fr/how-to-
-                    convert-a-matplotlib-figure-to-a-numpy-array-or-a-pil-image/
+def plt_fig_to_rgba(fig, out = None, draw = True):
+    """ RGBA pixels of a matplotlib figure as an n_r x n_c x 4 uint8 array
+        The pixels are read from canvas.buffer_rgba() through a memoryview,
+        so without out, the returned array is a view of the canvas that
+        changes when the figure is drawn again. 
+
+        :param out: np.ndarray
+            n_r x n_c x 4 or n_r x n_c x 3 array to copy the RGBA or RGB
+            pixels into.
+        :param draw: bool
+            draw the canvas first, set to False if it is already drawn.
     """
-    fig.canvas.draw()
-    w,h = fig.canvas.get_width_height()
-    buf = np.frombuffer(fig.canvas.tostring_argb(), dtype=np.ubyte)
-    buf.shape = (w, h, 4)
-    return buf.sum(2)
+    if draw:
+        fig.canvas.draw()
+    try:
+        buf = np.asarray(fig.canvas.buffer_rgba())
+    except AttributeError:
+        w, h = fig.canvas.get_width_height()
+        buf = np.frombuffer(fig.canvas.tostring_argb(), dtype=np.uint8)
+        buf = np.roll(buf.reshape(h, w, 4), -1, axis = 2)
+    if out is None:
+        return buf
+    out[...] = buf[..., :out.shape[-1]]
+    return out
+
+def plt_figs_to_numpy(figs, out = None, n_frames = None, n_channels = 3):
+    """ capture many frames of figures into one array
+        figs can be a generator that updates a figure and yields it for 
+        every frame, e.g. a rotating 3D plot. The output array is allocated
+        once when the first frame is drawn, unless out is given.
+
+        :param figs: iterable of matplotlib figures
+        :param out: np.ndarray
+            n_frames x n_r x n_c x n_channels uint8 array to write into.
+        :param n_frames: int
+            number of frames, if figs has no len() and out is not given.
+        :param n_channels: int
+            3 for RGB and 4 for RGBA.
+        :return: n_frames x n_r x n_c x n_channels uint8 array
+    """
+    if (out is None) & (n_frames is None):
+        try: n_frames = len(figs)
+        except TypeError: pass
+    frames = []
+    frm_cnt = -1
+    for frm_cnt, fig in enumerate(figs):
+        if out is None:
+            buf = plt_fig_to_rgba(fig)
+            if n_frames is None:
+                frames.append(buf[..., :n_channels].copy())
+                continue
+            out = np.empty((n_frames,) + buf.shape[:2] + (n_channels,),
+                           dtype = np.uint8)
+            out[frm_cnt] = buf[..., :n_channels]
+        else:
+            plt_fig_to_rgba(fig, out = out[frm_cnt])
+    if out is None:
+        return np.array(frames)
+    return out[:frm_cnt + 1]
+
+def plt_fig_to_numpy_3ch(fig, out = None):
+    """Convert a matplotlib figure to a numpy 2D array (RGB).
+        :param out: n_r x n_c x 3 uint8 array to write into.
+    """
+    if out is None:
+        return plt_fig_to_rgba(fig)[..., :3].copy()
+    return plt_fig_to_rgba(fig, out = out)
+
+def plt_fig_to_numpy(fig, out = None):
+    """ a figure as a 2D array, the sum of its RGBA channels
+        :param out: n_r x n_c array to write into.
+    """
+    return plt_fig_to_rgba(fig).sum(2, out = out)
 
 def numbers_as_images_3D(data3D_shape: tuple,
                          fontsize: int, 
@@ -1590,25 +2232,24 @@ def numbers_as_images_3D(data3D_shape: tuple,
     
     dataset = np.zeros(data3D_shape)    
     txt_width = int(np.log(n_x)/np.log(n_x)) + 1
-    number_text_base = '{ind_x:0{width}}}'
+    number_text_base = '{ind_x:0{width}}'
     if(verbose):
         from lognflow import printprogress
         pBar = printprogress(n_x)
+    n_rc = np.minimum(n_r, n_c)
+    fig = plt.figure(figsize = (n_c / n_rc, n_r / n_rc), dpi = n_rc)
+    ax = fig.add_subplot(111)
+    ax.imshow(np.ones((n_r, n_c)), cmap = 'gray', vmin = 0, vmax = 1)
+    txt = ax.text(text_loc[0], text_loc[1], '', fontsize = fontsize)
+    ax.axis('off')
     for ind_x in range(n_x):
-        mat = np.ones((n_r, n_c))
         number_text = number_text_base.format(ind_x = ind_x, 
                                               width = txt_width)
-        fig = plt.figure(figsize = (n_rr, n_cc), dpi = n_rc)
-        ax = fig.add_subplot(111)
-        ax.imshow(mat, cmap = 'gray', vmin = 0, vmax = 1)
-        ax.text(text_loc[0], text_loc[1],
-                number_text, fontsize = fontsize)
-        ax.axis('off')
-        buf = plt_fig_to_numpy(fig)
-        plt.close()
-        dataset[ind_x] = buf.copy()
+        txt.set_text(number_text)
+        plt_fig_to_numpy(fig, out = dataset[ind_x])
         if(verbose):
             pBar()
+    plt.close(fig)
     return dataset
 
 def numbers_as_images_4D(data4D_shape: tuple,
@@ -1647,24 +2288,21 @@ def numbers_as_images_4D(data4D_shape: tuple,
     if(verbose):
         from lognflow import printprogress
         pBar = printprogress(n_x * n_y)
+    n_rc = np.minimum(n_r, n_c)
+    fig = plt.figure(figsize = (n_c / n_rc, n_r / n_rc), dpi = n_rc)
+    ax = fig.add_subplot(111)
+    ax.imshow(np.ones((n_r, n_c)), cmap = 'gray', vmin = 0, vmax = 1)
+    txt = ax.text(text_loc[0], text_loc[1], '', fontsize = fontsize)
+    ax.axis('off')
     for ind_x in range(n_x):
         for ind_y in range(n_y):
-            mat = np.ones((n_r, n_c))
             number_text = number_text_base.format(
                 ind_x = ind_x, ind_y = ind_y, width = txt_width)
-            n_rc = np.minimum(n_r, n_c)
-            n_rr = n_r / n_rc
-            n_cc = n_c / n_rc
-            fig = plt.figure(figsize = (n_rr, n_cc), dpi = n_rc)
-            ax = fig.add_subplot(111)
-            ax.imshow(mat, cmap = 'gray', vmin = 0, vmax = 1)
-            ax.text(text_loc[0], text_loc[1], number_text, fontsize = fontsize)
-            ax.axis('off')
-            buf = plt_fig_to_numpy(fig)
-            plt.close()
-            dataset[ind_x, ind_y] = buf.copy()
+            txt.set_text(number_text)
+            plt_fig_to_numpy(fig, out = dataset[ind_x, ind_y])
             if(verbose):
                 pBar()
+    plt.close(fig)
     return dataset
 
 class plot_gaussian_gradient:
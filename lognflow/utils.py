@@ -1,4 +1,5 @@
 import os
+import re
 from pathlib import Path as pathlib_Path
 import posixpath
 import numpy as np
@@ -383,6 +384,44 @@ def name_from_file(log_dir, fpath):
     
     return os.path.relpath(fpath, start=log_dir)
     
+_time_tag_pattern = re.compile(r'_(?:(\d+)_)?(\d+(?:\.\d+)?)(?:\.[^.]*)?$')
+
+def sort_by_time_tag(flist):
+    """ sort files by the time tags in their names
+        lognflow puts tags at the end of the file names: name_<time>,
+        name_<index> or name_<index>_<time> for time_and_index. Files with
+        no tag, e.g. name or name_initial, come first sorted by name, then 
+        the rest by their tag and then by their index. Files with the same
+        tags keep their order in flist.
+        The tags of each name are parsed once into a sort key.
+        
+        :param flist:
+            list of Paths
+        :return:
+            sorted list of the same Paths
+    """
+    if len(flist) < 2:
+        return list(flist)
+    untagged, tagged, keys = [], [], []
+    has_index = False
+    for fpath in flist:
+        tags = _time_tag_pattern.search(fpath.name)
+        if tags is None:
+            untagged.append(fpath)
+            continue
+        index_tag, time_tag = tags.groups()
+        tagged.append(fpath)
+        keys.append((time_tag, index_tag))
+        has_index = has_index or (index_tag is not None)
+    if has_index:
+        keys = [(float(time_tag), -1.0 if index_tag is None else 
+                 float(index_tag)) for time_tag, index_tag in keys]
+    else:
+        keys = [float(time_tag) for time_tag, _ in keys]
+    sortinds = sorted(range(len(tagged)), key = keys.__getitem__)
+    untagged.sort(key = lambda fpath: fpath.name)
+    return untagged + [tagged[_] for _ in sortinds]
+
 def repr_raw(text):
     """ Raw text representation
         Returns a raw string representation of a text that has escape 
@@ -963,6 +1002,68 @@ def find_duplicates(a_list):
     duplicates = [item for item, count in element_count.items() if count > 1]
     return duplicates
 
+class lazystack:
+    """ A stack of files that reads frames only when they are indexed
+
+        All files are supposed to hold arrays of the same shape and dtype.
+        Only the first file is read to find them. Indexing with an integer
+        reads one file, indexing with a slice, a list or a boolean mask
+        reads those files and stacks them. The remaining indices of a tuple
+        are applied to every frame, e.g. stack[10:20, 5, :].
+        np.array(stack) reads all files into one preallocated array.
+
+        :param flist:
+            list of Paths of the files
+        :param read_func:
+            the function that takes the Path of a file and returns the data
+            in there, default: np.load
+    """
+    def __init__(self, flist, read_func = None):
+        self.flist = list(flist)
+        assert len(self.flist) > 0, 'lazystack: the file list is empty.'
+        self.read_func = np.load if read_func is None else read_func
+        frame = np.asarray(self.read_func(self.flist[0]))
+        self.frame_shape = frame.shape
+        self.dtype = frame.dtype
+
+    @property
+    def shape(self):
+        return (len(self.flist), ) + self.frame_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return len(self.flist)
+
+    def __iter__(self):
+        for fpath in self.flist:
+            yield self.read_func(fpath)
+
+    def __repr__(self):
+        return f'lazystack(shape={self.shape}, dtype={self.dtype})'
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            index, frame_index = index[0], index[1:]
+        else:
+            frame_index = ()
+        if isinstance(index, (int, np.integer)):
+            return np.asarray(self.read_func(self.flist[index]))[frame_index]
+        inds = np.arange(len(self.flist))[index]
+        frame = np.empty(self.frame_shape, dtype = self.dtype)[frame_index]
+        out = np.empty((len(inds), ) + frame.shape, dtype = self.dtype)
+        for cnt, ind in enumerate(inds):
+            out[cnt] = np.asarray(self.read_func(self.flist[ind]))[frame_index]
+        return out
+
+    def __array__(self, dtype = None, copy = None):
+        out = self[:]
+        if dtype is not None:
+            out = out.astype(dtype)
+        return out
+
 class block_runner:
     """
     A Jupyter-like Python code runner that executes code in blocks based 
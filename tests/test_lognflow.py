@@ -110,6 +110,134 @@ def test_record():
     for _ in range(1000):
         logger.record('vars/vec/v.to.txt', np.random.rand(10000))
         
+def test_async_write():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False, async_write = True,
+                       log_flush_period = 0)
+    logger('This is a test for async_write')
+    for _ in range(1000):
+        logger(f'{_}')
+    for _ in range(100):
+        logger.record('vars/v', np.random.rand(100), log_size_limit = 8000)
+    logger.flush_all()
+
+    txt = logger.get_text('log*')
+    assert len(txt) == 1001
+    assert len(logger.get_flist('vars/v*.npz')) == 10
+
+    logger = getLogger(temp_dir, print_text = False, async_write = True,
+                       async_queue_size = 1, async_policy = 'drop',
+                       log_flush_period = 0)
+    import threading
+    writer_is_busy = threading.Event()
+    # the writer waits for the event, so the queue of one job gets full
+    logger.async_writer.put(writer_is_busy.wait)
+    for _ in range(1000):
+        logger(f'{_}')
+    writer_is_busy.set()
+    logger.flush_all()
+    txt = logger.get_text('log*')
+    n_dropped = logger.async_writer.n_dropped
+    print(f'lines written: {len(txt)}, writes dropped: {n_dropped}')
+    assert n_dropped > 0
+    assert len(txt) + n_dropped == 1000
+    assert not logger.async_writer._thread.is_alive()
+
+    def fail_to_write():
+        raise OSError('disk is full')
+    logger.async_writer.put(fail_to_write)
+    try:
+        logger.async_writer.join()
+        raise RuntimeError('the error of the writer should be raised')
+    except OSError as e:
+        print(f'raised: {e}')
+
+def test_max_open_files():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False, max_open_files = 8,
+                       log_flush_period = 0)
+    for _ in range(3):
+        for log_cnt in range(100):
+            logger.text(f'logs/log{log_cnt}', f'{_}', time_tag = False)
+    assert len(logger._file_handles) == 8
+    logger.flush_all()
+    assert len(logger._file_handles) == 0
+    for log_cnt in range(100):
+        assert len(logger.get_text(f'logs/log{log_cnt}')) == 3
+
+    logger.text('logs/kept', 'kept open')
+    for _ in range(20):
+        logger.save('logs/once', 'written once', suffix = 'txt')
+    assert len(logger._file_handles) == 1
+    logger.replace_time_with_index('logs/kept*')
+    assert len(logger._file_handles) == 0
+
+def test_text_rotation():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False)
+    for _ in range(1000):
+        logger.text('rotated', f'{_:04d}', log_time_stamp = False,
+                    log_size_limit = 500, time_tag = False)
+    logger.flush_all()
+    flist = logger.get_flist('rotated_*.txt')
+    print(f'number of segments: {len(flist) + 1}')
+    assert len(flist) == 9
+    txt = logger.get_text('rotated', file_index = list(range(10)),
+                          segments = True)
+    assert sum([len(_) for _ in txt]) == 1000
+    assert txt[0][0] == '0000\n'
+    assert logger.get_text('rotated', segments = True)[0][-1] == '0999\n'
+    flist = logger.get_flist('rotated')
+    assert len(flist) == 10
+    assert flist[0].name == 'rotated.txt'
+    assert logger.get_text('rotated')[0][-1] == '0999\n'
+
+    logger = getLogger(temp_dir, print_text = False)
+    for _ in range(1050):
+        logger.text('rotated', f'{_:04d}', log_time_stamp = False,
+                    log_size_limit = 500, log_max_segments = 3)
+    logger.flush_all()
+    assert len(logger.get_flist('rotated*.txt')) == 3
+    assert logger.get_text(
+        'rotated', file_index = 0, segments = True)[0][0] == '0800\n'
+    assert logger.get_text('rotated', segments = True)[0][-1] == '1049\n'
+    logger.rename(logger.log_dir.name + '_renamed')
+    for _ in range(1050, 1280):
+        logger.text('rotated', f'{_:04d}', log_time_stamp = False,
+                    log_size_limit = 500, log_max_segments = 3)
+    logger.flush_all()
+    flist = logger.get_flist('rotated*.txt')
+    assert len(flist) == 3
+    assert all([fpath.parent == logger.log_dir for fpath in flist])
+    assert logger.get_text('rotated', segments = True)[0][-1] == '1279\n'
+
+def test_record_npy():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False)
+    logger('This is a test for record into a single npy file')
+    for _ in range(1000):
+        logger.record('vars/vec', np.ones((3, 2)) * _, suffix = 'npy',
+                      log_size_limit = 4800)
+        if _ == 555:
+            logger.record_flush('vars/vec.npy')
+    time_array, data_array = logger.get_record('vars/vec', suffix = 'npy')
+    assert data_array.shape == (1000, 3, 2)
+    assert (np.diff(data_array[:, 0, 0]) == 1).all()
+    assert (np.diff(time_array) > 0).all()
+    logger.flush_all()
+    assert len(logger.get_flist('vars/*')) == 1
+    time_array, data_array = logger.load('vars/vec')
+    assert not isinstance(data_array, np.memmap)
+    assert data_array[-1, 0, 0] == 999
+    time_array, data_array = logger.load('vars/vec', mmap_mode = 'r')
+    assert isinstance(data_array, np.memmap)
+    assert data_array[-1, 0, 0] == 999
+
+    not_a_record = np.zeros(5, dtype = [('time', 'f8'), ('data', 'f8')])
+    logger.save('vars/not_a_record', not_a_record, suffix = 'npy',
+                time_tag = False)
+    assert logger.load('vars/not_a_record').dtype == not_a_record.dtype
+
 def test_record_without_time_stamp():
     print('Testing function', inspect.currentframe().f_code.co_name)
     logger = getLogger(temp_dir)
@@ -157,6 +285,41 @@ def test_log_animation():
     logger('This is a test for log_animation')    
     logger.log_animation('var1',var1)
 
+def test_log_animation_streaming():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    import tracemalloc
+    from PIL import Image
+    logger = getLogger(temp_dir, print_text = False)
+    def _frames(n_frames):
+        for _ in range(n_frames):
+            yield np.random.rand(128, 128)
+    peaks = []
+    for n_frames in [50, 200]:
+        tracemalloc.start()
+        time_time = time.time()
+        fpath = logger.log_animation('anim', _frames(n_frames), 
+                                     vmin = 0, vmax = 1, zoom = 1)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        print(f'{n_frames} frames in {time.time() - time_time:.3f}s, '
+              f'peak memory {peaks[-1]/1e6:.2f} MB')
+        with Image.open(fpath) as gif:
+            assert gif.n_frames == n_frames
+            assert gif.size == (128, 128)
+    assert peaks[1] < 2 * peaks[0]
+
+    stack = np.random.rand(10, 20, 30)
+    logger.save('stack', stack)
+    stack = logger.load('stack*', mmap_mode = 'r')
+    assert isinstance(stack, np.memmap)
+    fpath = logger.log_animation('anim_mmap', stack, zoom = 2)
+    with Image.open(fpath) as gif:
+        assert gif.n_frames == 10
+        assert gif.size == (60, 40)
+    fpath = logger.log_animation('anim_default', stack)
+    with Image.open(fpath) as gif:
+        assert gif.size == (30 * 16, 20 * 16)
+
 def test_save_matlab():
     print('Testing function', inspect.currentframe().f_code.co_name)
     logger = getLogger(temp_dir)
@@ -348,6 +511,21 @@ def test_rename():
     logger('This is a test for test_rename')
     logger.rename(logger.log_dir.name + '_new_name')
     logger('This is another test for test_rename')
+
+def test_rename_with_records():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False)
+    logger('This is a test for records across rename')
+    for _ in range(10):
+        logger.record('vars/v', np.ones(3) * _, suffix = 'npy')
+    logger.rename(logger.log_dir.name + '_renamed')
+    for _ in range(10, 20):
+        logger.record('vars/v', np.ones(3) * _, suffix = 'npy')
+    logger.flush_all()
+    assert logger._vars_dict['vars/v.npy'].fpath.parent.parent == logger.log_dir
+    time_array, data_array = logger.get_record('vars/v', suffix = 'npy')
+    assert data_array.shape == (20, 3)
+    assert (np.diff(data_array[:, 0]) == 1).all()
     
 def test_save_text():
     print('Testing function', inspect.currentframe().f_code.co_name)
@@ -459,6 +637,35 @@ def test_variables_to_pdf():
     logger.imshow('im1', np.random.randn(20, 40))
     logger.variables_to_pdf('im1_all', 'im1*.*', time_tag = False)
 
+def test_images_to_pdf_streaming():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    import tracemalloc
+    import re
+    logger = getLogger(temp_dir)
+    
+    def frames(n_frames):
+        for cnt in range(n_frames):
+            yield (np.random.rand(200, 300, 3) * 255).astype('uint8')
+    
+    for n_frames in [50, 200]:
+        tracemalloc.start()
+        timer = time.time()
+        logger.images_to_pdf(f'pages_{n_frames}', frames(n_frames), 
+                             time_tag = False, title = 'streaming')
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{n_frames} pages in {time.time() - timer:.3f}s, '
+              f'peak memory {peak / 1e6:.2f} MB')
+        
+        data = logger.get_flist(f'pages_{n_frames}*')[0].read_bytes()
+        assert data.count(b'/Type /Page ') == n_frames
+        xref = int(re.search(rb'startxref\n(\d+)', data).group(1))
+        assert data[xref:xref + 4] == b'xref'
+        offsets = data[xref:].split(b'\n')[3:]
+        for obj_id in [1, 2, 3, 3 * n_frames + 3]:
+            offset = int(offsets[obj_id - 1][:10])
+            assert data[offset:].startswith(b'%d 0 obj' % obj_id)
+
 def test_log_code():
     print('Testing function', inspect.currentframe().f_code.co_name)
     logger = getLogger(temp_dir)
@@ -527,6 +734,201 @@ def test_get_stack_from_files():
         logger('Size of the log file in bytes is: ' \
                + f'{_}')
 
+def test_get_stack_from_files_lazy():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir)
+    logger('This is a test for lazy get_stack_from_files')
+    for _ in range(20):
+        logger.save('C/img', np.ones((50, 60)) * _)
+
+    stack = logger.get_stack_from_files('C/*', lazy = True, mmap_mode = 'r')
+    assert stack.shape == (20, 50, 60)
+    assert len(stack) == 20
+    assert stack[3][0, 0] == 3
+    assert stack[5:10, 2, :].shape == (5, 60)
+    assert (stack[[1, 7], 0, 0] == [1, 7]).all()
+    assert np.array(stack).sum() == np.arange(20).sum() * 50 * 60
+
+    stack_threads = logger.get_stack_from_files('C/*', n_workers = 4)
+    assert (stack_threads == np.array(stack)).all()
+    stack_threads = logger.get_stack_from_names('C/*', n_workers = 4)
+    assert (stack_threads == np.array(stack)).all()
+    def read_func(fpath):
+        if fpath == stack.flist[7]:
+            raise ValueError('file could not be read')
+        return np.load(fpath)
+    with pytest.raises(ValueError):
+        logger.get_stack_from_files(
+            'C/*', read_func = read_func, n_workers = 4)
+
+    logger.save('C/img', np.ones((5, 6)))
+    stack = logger.get_stack_from_files('C/*')
+    assert isinstance(stack, list)
+    assert len(stack) == 21
+    assert stack[20].shape == (5, 6)
+    stack = logger.get_stack_from_names(['C/img*'])
+    assert isinstance(stack, list)
+    assert stack[3][0, 0] == 3
+
+    img = logger.load('C/img*', file_index = 4, mmap_mode = 'r')
+    assert isinstance(img, np.memmap)
+    assert img[0, 0] == 4
+
+def test_get_flist_dir_index():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False)
+    for _ in range(500):
+        logger.save('D/img', np.ones(3) * _)
+    time_time = time.time()
+    stack = logger.get_stack_from_names('D/img*')
+    print(f'get_stack_from_names of 500 files: {time.time() - time_time:.3f}s')
+    assert stack.shape == (500, 3)
+    assert (stack[:, 0] == np.arange(500)).all()
+
+    logger.save('D/img', np.ones(3))
+    assert len(logger.get_flist('D/img*')) == 501
+    (logger.log_dir / 'D' / 'other.npy').write_bytes(b'')
+    assert len(logger.get_flist('D/*')) == 502
+    assert logger.get_flist('D/other.npy') == [logger.log_dir/'D'/'other.npy']
+
+def test_manifest():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False, manifest = True)
+    logger('This is a test for the manifest')
+    for _ in range(5):
+        logger.save('E/img', np.ones((3, 4)) * _)
+    logger.plot('E/plot', np.arange(10))
+    for _ in range(30):
+        logger.record('E/vec', np.ones(3) * _, suffix = 'npy',
+                      log_size_limit = 240)
+    logger.flush_all()
+
+    manifest = logger.get_manifest()
+    assert manifest['E/vec.npy']['shape'] == [30]
+    assert manifest['E/img_0.npy']['shape'] == [3, 4]
+    assert manifest['E/img_0.npy']['name'] == 'E/img'
+    flist = logger.get_flist('E/img*')
+    assert len(flist) == 5
+    assert logger.load('E/img*', file_index = 3)[0, 0] == 3
+
+    # ** is zero or more directories
+    top_fpath = logger.save('top', np.ones(2))
+    flist_npy = logger.get_flist('**/*.npy')
+    assert top_fpath in flist_npy
+    assert set(flist) <= set(flist_npy)
+
+    # a file removed from the disk is not found from the manifest
+    flist[0].unlink()
+    logger = getLogger(log_dir = logger.log_dir, manifest = True)
+    assert logger.get_flist('E/img*') == flist[1:]
+
+def test_render_workers():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False)
+    time_time = time.time()
+    for _ in range(4):
+        logger.imshow('F/img', np.random.rand(4, 32, 32), dpi = 300)
+    print(f'imshow of 4 stacks in the caller: {time.time() - time_time:.3f}s')
+
+    logger = getLogger(temp_dir, print_text = False, render_workers = 2)
+    time_time = time.time()
+    futures = [logger.imshow('F/img', np.random.rand(4, 32, 32), dpi = 300)
+               for _ in range(4)]
+    futures.append(logger.plot('F/plot', np.arange(10), dpi = 300))
+    futures.append(logger.hist('F/hist', np.random.rand(100), title = 'h',
+                               dpi = 300))
+    print(f'imshow of 4 stacks with render_workers: '
+          f'{time.time() - time_time:.3f}s')
+    logger.flush_all()
+    print(f'after flush_all: {time.time() - time_time:.3f}s')
+    fpaths = [_.result() for _ in futures]
+    assert len(set(fpaths)) == 6
+    for fpath in fpaths:
+        assert fpath.stat().st_size > 0
+    assert logger.get_flist('F/img*') == fpaths[:4]
+    assert logger._render_pool is None
+    assert logger.plot('F/plot', np.arange(10)).result().stat().st_size > 0
+    logger.flush_all()
+
+    fig, ax = logger.plot('F/plot', np.arange(10), return_figure = True)
+    assert ax is not None
+
+def test_defer_plots():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False, defer_plots = True,
+                       manifest = True)
+    time_time = time.time()
+    for _ in range(20):
+        logger.imshow('G/img', np.random.rand(4, 32, 32), dpi = 100)
+        logger.plot('G/plot', np.arange(10) * _, dpi = 100)
+    print(f'40 deferred plots: {time.time() - time_time:.3f}s')
+    assert len(logger.get_flist('G/img*')) == 20
+    assert logger.load('G/img*', file_index = 0) is None
+
+    time_time = time.time()
+    fpaths = logger.render_plots('G/img*', n_workers = 2)
+    print(f'rendering 20 of them: {time.time() - time_time:.3f}s')
+    assert len(fpaths) == 20
+    assert all([_.suffix == '.jpg' for _ in fpaths])
+    assert len(logger.render_plots('G/img*')) == 0
+    fpaths = logger.render_plots(remove_specs = True)
+    assert len(fpaths) == 20
+    assert len(logger.get_flist('G/*.pltspec')) == 20
+    assert len(logger.get_flist('G/*.jpg')) == 40
+    assert logger.get_manifest()[
+        logger.name_from_file(fpaths[0])]['name'] == 'G/plot'
+
+def test_imshow_fast():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    logger = getLogger(temp_dir, print_text = False)
+    img = np.random.rand(256, 256)
+    time_time = time.time()
+    logger.imshow('H/img', img, dpi = 100)
+    print(f'imshow with a figure: {time.time() - time_time:.4f}s')
+    time_time = time.time()
+    for _ in range(100):
+        fpath = logger.imshow('H/img_fast', img, fast = True)
+    print(f'imshow with fast: {(time.time() - time_time)/100:.4f}s')
+    assert len(logger.get_flist('H/img_fast*')) == 100
+    img_loaded = logger.load(fpath)
+    assert img_loaded.shape[0] == 256
+    assert img_loaded.shape[1] > 256
+    fpath = logger.imshow('H/rgb', np.random.rand(4, 32, 32, 3), fast = True,
+                          image_format = 'png', colorbar = False)
+    assert logger.load(fpath).shape[2] == 3
+
+def test_reuse_figures():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    n_calls = 20
+    for reuse_figures in [0, 4]:
+        logger = getLogger(temp_dir, print_text = False,
+                           reuse_figures = reuse_figures)
+        time_time = time.time()
+        for _ in range(n_calls):
+            logger.plot('I/plot', [np.random.rand(100), np.random.rand(100)],
+                        dpi = 50, title = f'{_}')
+        time_plot = (time.time() - time_time) / n_calls
+        time_time = time.time()
+        for _ in range(n_calls):
+            logger.imshow('I/img', np.random.rand(64, 64) * _, dpi = 50)
+        time_imshow = (time.time() - time_time) / n_calls
+        time_time = time.time()
+        for _ in range(n_calls):
+            logger.hist('I/hist', [np.random.rand(100)], dpi = 50)
+        time_hist = (time.time() - time_time) / n_calls
+        print(f'reuse_figures = {reuse_figures}: plot: {time_plot:.4f}s, '
+              f'imshow: {time_imshow:.4f}s, hist: {time_hist:.4f}s per call')
+        assert len(logger.get_flist('I/plot*')) == n_calls
+        assert len(logger.get_flist('I/img*')) == n_calls
+    assert len(logger._figures) == 3
+
+    img_a = logger.load(logger.imshow('I/cmp', np.eye(32), dpi = 50))
+    logger.imshow('I/cmp', np.ones((32, 32)), dpi = 50)
+    img_b = logger.load(logger.imshow('I/cmp', np.eye(32), dpi = 50))
+    assert np.abs(img_a.astype(float) - img_b).mean() < 1
+    logger.imshow('I/cmp', np.eye(16), dpi = 50)
+    assert len(logger._figures) == 4
+
 def test_text_to_object():
     print('Testing function', inspect.currentframe().f_code.co_name)
     logger = getLogger(temp_dir, time_tag = False)
@@ -691,6 +1093,7 @@ if __name__ == '__main__':
     test_save_text()
     test_lognflow_conflict_in_names()
     test_rename()
+    test_rename_with_records()
     test_logger()
     test_log_flush_period()
     test_get_record()
@@ -1,5 +1,6 @@
 from lognflow import multiprocessor, printprogress
-from lognflow.multiprocessor import multiprocessor_gen, loopprocessor
+from lognflow.multiprocessor import multiprocessor_gen, loopprocessor, \
+    workerpool, multiprocessor_imap, _batchsizer, _get_from_queue
 from lognflow.utils import print_box
 import numpy as np
 import inspect
@@ -251,6 +252,310 @@ def test_multiprocessor_gen():
     print((results - results_mp).sum())
     print('-'*80)
 
+def error_at_30(iterables_sliced, shareables):
+    if iterables_sliced == 30:
+        raise ValueError
+    return iterables_sliced * shareables
+
+def test_workerpool():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    N = 1000
+    time_of_start = time.time()
+    results = multiprocessor(func_to_run, N, 3, batchSize = 1, max_cpu = 4)
+    print(f'one call: {time.time() - time_of_start:.3f}s')
+    assert (results == 3 * np.arange(N)).all()
+    
+    with workerpool(max_cpu = 4) as pool:
+        time_of_start = time.time()
+        results = multiprocessor(func_to_run, N, 3, batchSize = 1, 
+                                 pool = pool)
+        print(f'workerpool: {time.time() - time_of_start:.3f}s')
+        assert (results == 3 * np.arange(N)).all()
+        
+        for cnt in range(10):
+            results = multiprocessor(func_to_run, 20, cnt, pool = pool)
+            assert (results == cnt * np.arange(20)).all()
+        
+        try:
+            multiprocessor(error_at_30, 100, 1, pool = pool, 
+                           logger = lambda *args: None)
+            raise RuntimeError('an error should have been raised')
+        except ValueError:
+            print('Error has been raised')
+        
+        for arrivals in multiprocessor_gen(func_to_run, 100, 2, 
+                                           batchSize = 5, pool = pool):
+            break
+        results = multiprocessor(func_to_run, 100, 5, pool = pool)
+        assert (results == 5 * np.arange(100)).all()
+        
+        # shareables changed in place are sent again
+        weight = np.array([1])
+        results = multiprocessor(func_to_run, 4, weight, pool = pool)
+        assert (results.ravel() == np.arange(4)).all()
+        weight[0] = 5
+        results = multiprocessor(func_to_run, 4, weight, pool = pool)
+        assert (results.ravel() == 5 * np.arange(4)).all()
+
+def start_a_process(iterables_sliced):
+    from multiprocessing import Process
+    proc = Process(target = time.sleep, args = (0, ))
+    proc.start()
+    proc.join()
+    return proc.exitcode + iterables_sliced
+
+def test_nested_processes():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    results = multiprocessor(start_a_process, 2, max_cpu = 2)
+    assert (results.ravel() == np.arange(2)).all()
+    with workerpool(max_cpu = 2) as pool:
+        results = multiprocessor(start_a_process, 4, pool = pool)
+        assert (results.ravel() == np.arange(4)).all()
+
+def weighted_mean(iterables_sliced, shareables):
+    vec1, vec2 = iterables_sliced
+    weights = shareables[0]
+    return (vec1 * vec2 * weights).mean()
+
+def test_shared_memory():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    data_shape = (100, 200000)
+    data1 = np.random.randn(*data_shape)
+    data2 = np.random.randn(*data_shape)
+    weights = np.random.rand(data_shape[1])
+    expected = (data1 * data2 * weights).mean(1)
+    
+    with workerpool(max_cpu = 4) as pool:
+        for shared_memory in [False, True]:
+            time_of_start = time.time()
+            results = multiprocessor(
+                weighted_mean, (data1, data2), (weights, ), batchSize = 5, 
+                pool = pool, shared_memory = shared_memory)
+            print(f'shared_memory = {shared_memory}: '
+                  f'{time.time() - time_of_start:.3f}s')
+            assert np.allclose(results, expected)
+        
+        outputs = np.zeros((data_shape[0], 1))
+        multiprocessor(weighted_mean, (data1, data2), (weights, ), 
+                       outputs = outputs, batchSize = 5, pool = pool)
+        assert np.allclose(outputs[:, 0], expected)
+    
+    outputs = np.zeros((data_shape[0], 1))
+    multiprocessor(weighted_mean, (data1, data2), (weights, ), 
+                   outputs = outputs, batchSize = 5)
+    assert np.allclose(outputs[:, 0], expected)
+
+def sleep_and_return(iterables_sliced):
+    time.sleep(0.05)
+    return iterables_sliced
+
+def test_blocking_wait():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    N = 40
+    time_of_start = time.time()
+    cpu_time_of_start = time.process_time()
+    results = multiprocessor(sleep_and_return, N, max_cpu = 4, batchSize = 1)
+    period = time.time() - time_of_start
+    cpu_time = time.process_time() - cpu_time_of_start
+    print(f'multiprocessor: {period:.3f}s, CPU time of the parent: '
+          f'{cpu_time:.3f}s')
+    assert (results == np.arange(N)).all()
+    
+    time_of_start = time.time()
+    cpu_time_of_start = time.process_time()
+    sleep_lp = loopprocessor(sleep_and_return, n_cpu = 4, verbose = False)
+    for cnt in range(N):
+        sleep_lp(cnt)
+    results = sleep_lp()
+    period = time.time() - time_of_start
+    cpu_time = time.process_time() - cpu_time_of_start
+    print(f'loopprocessor: {period:.3f}s, CPU time of the parent: '
+          f'{cpu_time:.3f}s')
+    assert (np.array(results) == np.arange(N)).all()
+    
+    from multiprocessing import Queue, Process
+    aQ = Queue()
+    assert _get_from_queue(aQ, block = False) is None
+    aQ.put(1)
+    assert _get_from_queue(aQ) == 1
+    proc = Process(target = exit_at_3, args = (3, ))
+    proc.start()
+    proc.join()
+    try:
+        _get_from_queue(aQ, processes = [proc])
+        raise RuntimeError('an error should have been raised')
+    except ChildProcessError as e:
+        print(e)
+
+def exit_at_3(iterables_sliced):
+    if iterables_sliced == 3:
+        import os
+        os._exit(7)
+    time.sleep(0.05)
+    return iterables_sliced
+
+def test_dead_worker():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    for cnt in range(3):
+        time_of_start = time.time()
+        try:
+            multiprocessor(exit_at_3, 10, max_cpu = 2, batchSize = 1)
+            raise RuntimeError('an error should have been raised')
+        except ChildProcessError as e:
+            print(f'{e} after {time.time() - time_of_start:.3f}s')
+        assert time.time() - time_of_start < 10
+    
+    with workerpool(max_cpu = 2) as pool:
+        try:
+            multiprocessor(exit_at_3, 10, batchSize = 1, pool = pool)
+            raise RuntimeError('an error should have been raised')
+        except ChildProcessError:
+            assert pool.broken
+        results = multiprocessor(sleep_and_return, 10, pool = pool)
+        assert (results == np.arange(10)).all()
+
+def uniform_workload(idx):
+    time.sleep(0.002)
+    return idx
+
+def skewed_workload(idx):
+    time.sleep(0.02 if idx < 40 else 0.001)
+    return idx
+
+def test_adaptive_batches():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    N = 400
+    max_cpu = 4
+    fixed_batchSize = int(np.ceil(N / max_cpu / 2))
+    for workload in [uniform_workload, skewed_workload]:
+        periods = {}
+        for batchSize in [fixed_batchSize, None]:
+            time_of_start = time.time()
+            results = multiprocessor(workload, N, max_cpu = max_cpu, 
+                                     batchSize = batchSize)
+            periods[batchSize] = time.time() - time_of_start
+            assert (results == np.arange(N)).all()
+        print(f'{workload.__name__}: batchSize = {fixed_batchSize}: '
+              f'{periods[fixed_batchSize]:.3f}s, adaptive: '
+              f'{periods[None]:.3f}s')
+
+def test_batchsizer():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    batchsizer = _batchsizer(1000, 4)
+    # before any measurement, a quarter of remaining / (2 * n_workers)
+    assert batchsizer(1000) == 32
+    
+    batchsizer.update(10, 0.1)
+    assert batchsizer.time_per_point == 0.01
+    # 125 points would take longer than max_period
+    assert batchsizer(1000) == 100
+    sizes = [batchsizer(remaining) for remaining in [400, 160, 40, 8, 1]]
+    print(f'sizes of the tail: {sizes}')
+    assert sizes == [50, 20, 5, 2, 1]
+    
+    batchsizer.update(100, 0.001)
+    assert np.isclose(batchsizer.time_per_point, 0.7 * 0.01 + 0.3 * 1e-5)
+    
+    batchsizer = _batchsizer(1000, 4)
+    batchsizer.update(1000, 0.01)
+    # one point takes 1e-5 s, batches last at least min_period
+    assert batchsizer(1000) == 1000
+    assert batchsizer(16000) == 2000
+    
+    batchsizer = _batchsizer(100, 4, batchSize = 50)
+    assert batchsizer.fixed_size == 13
+    assert batchsizer(100) == 13
+    assert batchsizer(5) == 5
+    batchsizer.update(13, 100)
+    assert batchsizer(100) == 13
+    assert _batchsizer(100, 4, batchSize = 3)(100) == 3
+    
+    batchsizer = _batchsizer(None, 4)
+    assert batchsizer(None) == 1
+    batchsizer.update(1, 0.001)
+    assert batchsizer(None) == 20
+    assert _batchsizer(None, 4, batchSize = 7)(None) == 7
+
+def count_and_double(idx, n_started):
+    with n_started.get_lock():
+        n_started.value += 1
+    time.sleep(0.001 * (idx % 7))
+    return 2 * idx
+
+def test_multiprocessor_imap():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    from multiprocessing import Value
+    N = 500
+    n_started = Value('i', 0)
+    time_of_start = time.time()
+    procIDs = []
+    for procID, result in multiprocessor_imap(
+            count_and_double, N, n_started, max_cpu = 4):
+        assert result[0] == 2 * procID
+        procIDs.append(procID)
+    print(f'ordered: {time.time() - time_of_start:.3f}s')
+    assert procIDs == list(range(N))
+    
+    procIDs = [procID for procID, result in multiprocessor_imap(
+        count_and_double, N, n_started, max_cpu = 4, ordered = False)]
+    assert sorted(procIDs) == list(range(N))
+    
+    max_in_flight = 12
+    n_started.value = 0
+    time_of_start = time.time()
+    for n_yielded, (procID, result) in enumerate(multiprocessor_imap(
+            count_and_double, N, n_started, max_cpu = 4, 
+            max_in_flight = max_in_flight)):
+        assert procID == n_yielded
+        assert n_started.value - n_yielded <= max_in_flight
+    print(f'max_in_flight = {max_in_flight}: '
+          f'{time.time() - time_of_start:.3f}s')
+
+def row_sum(row):
+    return row.sum()
+
+def test_lazy_iterables():
+    print('Testing function', inspect.currentframe().f_code.co_name)
+    import tempfile
+    import pathlib
+    N, D = 2000, 256
+    data = np.random.rand(N, D)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fpath = pathlib.Path(temp_dir) / 'data.npy'
+        np.save(fpath, data)
+        data_mmap = np.load(fpath, mmap_mode = 'r')
+        time_of_start = time.time()
+        results = multiprocessor(row_sum, data_mmap[100:], max_cpu = 4)
+        print(f'np.memmap: {time.time() - time_of_start:.3f}s')
+        assert np.allclose(results, data[100:].sum(1))
+        
+        outputs = np.lib.format.open_memmap(
+            pathlib.Path(temp_dir) / 'outputs.npy', mode = 'w+', 
+            dtype = 'float64', shape = (N, 1))
+        multiprocessor(row_sum, data_mmap, outputs = outputs, max_cpu = 4)
+        assert np.allclose(outputs[:, 0], data.sum(1))
+        del data_mmap, outputs
+    
+    n_read = []
+    def rows():
+        for cnt in range(N):
+            n_read.append(cnt)
+            yield data[cnt]
+    
+    prefetch = 16
+    max_in_flight = 12
+    time_of_start = time.time()
+    for n_yielded, (procID, result) in enumerate(multiprocessor_imap(
+            row_sum, rows(), max_cpu = 4, max_in_flight = max_in_flight,
+            prefetch = prefetch)):
+        assert procID == n_yielded
+        assert np.allclose(result[0], data[procID].sum())
+        assert len(n_read) - n_yielded <= max_in_flight + prefetch + 1
+    print(f'generator: {time.time() - time_of_start:.3f}s')
+    
+    results = multiprocessor(row_sum, (row for row in data), max_cpu = 4)
+    assert np.allclose(results, data.sum(1))
+
 """
 def test_custom_parfor():
     print('-'*80, '\n', inspect.stack()[0][3], '\n', '-'*80)
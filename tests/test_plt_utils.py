@@ -158,6 +158,73 @@ def test_plt_fig_to_numpy():
     print(np_data.shape)
     plt.close()
 
+def test_plt_fig_to_rgba():
+    print_box('Testing function', inspect.currentframe().f_code.co_name)
+    from lognflow.plt_utils import (
+        plt_fig_to_rgba, plt_figs_to_numpy, plt_fig_to_numpy_3ch)
+    fig, ax = plt.subplots(figsize = (4, 3), dpi = 100)
+    im = ax.imshow(np.random.rand(100, 100))
+    fig.canvas.draw()
+    time_time = time.time()
+    for _ in range(100):
+        buf = np.frombuffer(fig.canvas.tostring_argb(), dtype=np.uint8).copy()
+    print(f'tostring_argb: {(time.time() - time_time)/100:.6f}s')
+    out = np.empty((300, 400, 3), dtype = np.uint8)
+    time_time = time.time()
+    for _ in range(100):
+        plt_fig_to_rgba(fig, out = out, draw = False)
+    print(f'buffer_rgba into out: {(time.time() - time_time)/100:.6f}s')
+    time_time = time.time()
+    for _ in range(100):
+        view = plt_fig_to_rgba(fig, draw = False)
+    print(f'buffer_rgba as a view: {(time.time() - time_time)/100:.6f}s')
+    assert not view.flags['OWNDATA']
+    assert (out == buf.reshape(300, 400, 4)[..., 1:]).all()
+    assert plt_fig_to_numpy_3ch(fig).shape == (300, 400, 3)
+    assert lognflow.plt_utils.plt_fig_to_numpy(fig).shape == (300, 400)
+
+    def _frames():
+        for _ in range(5):
+            im.set_data(np.random.rand(100, 100))
+            yield fig
+    stack = plt_figs_to_numpy(_frames(), n_frames = 5)
+    assert stack.shape == (5, 300, 400, 3)
+    assert (stack[0] != stack[1]).any()
+    assert plt_figs_to_numpy(_frames(), n_channels = 4).shape[-1] == 4
+    plt.close(fig)
+
+def test_gifwriter():
+    print_box('Testing function', inspect.currentframe().f_code.co_name)
+    import tempfile, pathlib
+    from PIL import Image
+    from lognflow.plt_utils import gifwriter, colormap_lut, colormap_indices
+    fpath = pathlib.Path(tempfile.mkdtemp()) / 'test.gif'
+    frames = [np.random.rand(20, 30) for _ in range(5)]
+    rgb_frame = (np.random.rand(20, 30, 3) * 255).astype('uint8')
+    with gifwriter(fpath, interval = 100, vmin = 0, vmax = 1,
+                   repeat_delay = 500) as writer:
+        for frame in frames:
+            writer.append(frame)
+        writer.append(rgb_frame)
+    lut = colormap_lut('viridis')
+    with Image.open(fpath) as gif:
+        assert gif.n_frames == 6
+        for cnt, frame in enumerate(frames):
+            gif.seek(cnt)
+            assert gif.info['duration'] == 100
+            expected = lut[colormap_indices(frame, vmin = 0, vmax = 1)]
+            assert (np.array(gif.convert('RGB')) == expected).all()
+        gif.seek(5)
+        assert gif.info['duration'] == 600
+        assert np.abs(np.array(gif.convert('RGB')).astype(int) 
+                      - rgb_frame).mean() < 20
+
+    empty_fpath = fpath.parent / 'empty.gif'
+    with pytest.raises(ValueError):
+        with gifwriter(empty_fpath):
+            pass
+    assert not empty_fpath.exists()
+
 def test_plt_imshow_series():
     print_box('Testing function', inspect.currentframe().f_code.co_name)
     data = [1 + np.random.rand(10, 100, 100),
@@ -309,6 +376,126 @@ def test_stack_to_frame():
     lognflow.plt_utils.plt_colorbar(im)
     plt.show()
 
+def test_apply_colormap():
+    print_box('Testing function', inspect.currentframe().f_code.co_name)
+    from lognflow.plt_utils import apply_colormap
+    img = np.random.rand(512, 512)
+    img[0, 0] = np.nan
+    time_time = time.time()
+    for _ in range(100):
+        rgb = apply_colormap(img, cmap = 'viridis', vmin = 0, vmax = 1)
+    print(f'apply_colormap of 512 x 512: {(time.time() - time_time)/100:.5f}s')
+    ref = (plt.get_cmap('viridis')(np.floor(img * 255) / 255)[..., :3] * 255
+           + 0.5).astype('uint8')
+    assert rgb.shape == (512, 512, 3)
+    assert rgb.dtype == np.uint8
+    assert np.abs(rgb[1:].astype(int) - ref[1:]).max() <= 1
+    assert (rgb[0, 0] == ref[1:].reshape(-1, 3)[img[1:].argmin()]).all()
+
+    from lognflow.plt_utils import colormap_indices
+    inds = colormap_indices(np.array([[np.nan, -np.inf, np.inf, 0.5]]), 
+                            vmin = 0, vmax = 1)
+    assert inds.tolist() == [[0, 0, 255, 127]]
+
+    rgb = apply_colormap(img, colorbar = True)
+    assert rgb.shape[1] > 512
+    assert apply_colormap(np.random.rand(4, 5, 3)).dtype == np.uint8
+
+def _stack_to_frame_loop(stack, frame_shape = None, borders = 0):
+    is_rgb = stack.shape[-1] == 3
+    n_im, n_R, n_C = stack.shape[:3]
+    if frame_shape is None:
+        square_side = int(np.ceil(np.sqrt(n_im)))
+        frame_shape = (square_side, square_side)
+    frame_n_r, frame_n_c = frame_shape
+    n_R += 2
+    n_C += 2
+    frame = np.zeros((n_R * frame_n_r, n_C * frame_n_c) + (3,) * is_rgb,
+                     dtype = stack.dtype) + borders
+    used_ch_cnt = 0
+    for rcnt in range(frame_n_r):
+        for ccnt in range(frame_n_c):
+            if rcnt + frame_n_c*ccnt < n_im:
+                frame[rcnt*n_R + 1: (rcnt + 1)*n_R - 1,
+                      ccnt*n_C + 1: (ccnt + 1)*n_C - 1] = stack[used_ch_cnt]
+                used_ch_cnt += 1
+    return frame
+
+def test_stack_to_frame_vectorized():
+    print_box('Testing function', inspect.currentframe().f_code.co_name)
+    from lognflow.plt_utils import stack_to_frame, stacks_to_frames
+    for shape, frame_shape in [((10, 5, 6), None), 
+                               ((7, 4, 4, 3), None),
+                               ((12, 3, 4), (3, 4)),
+                               ((5, 3, 4), (2, 5))]:
+        stack = np.random.rand(*shape)
+        assert np.array_equal(
+            stack_to_frame(stack, frame_shape = frame_shape, borders = np.nan),
+            _stack_to_frame_loop(stack, frame_shape, borders = np.nan),
+            equal_nan = True)
+
+    stack = np.random.rand(10000, 8, 8)
+    time_time = time.time()
+    frame_loop = _stack_to_frame_loop(stack)
+    print(f'stack_to_frame of 10000 patches with loops: '
+          f'{time.time() - time_time:.4f}s')
+    out = np.empty_like(frame_loop)
+    time_time = time.time()
+    frame = stack_to_frame(stack, out = out)
+    print(f'stack_to_frame of 10000 patches: {time.time() - time_time:.4f}s')
+    assert frame is out
+    assert np.array_equal(frame, frame_loop)
+
+    stacks = np.random.rand(20, 100, 8, 8)
+    time_time = time.time()
+    frames = stacks_to_frames(stacks)
+    print(f'stacks_to_frames of 20 x 100 patches: '
+          f'{time.time() - time_time:.4f}s')
+    assert np.array_equal(frames[3], _stack_to_frame_loop(stacks[3]))
+
+def _label_connected_same_values_loop(image, ignore_value = None):
+    import scipy.ndimage
+    labeled = np.zeros_like(image, dtype=int)
+    centers, values, sizes = [], [], []
+    label_counter = 1
+    for val in np.unique(image):
+        if val == ignore_value:
+            continue
+        mask = image == val
+        labels, n = scipy.ndimage.label(mask)
+        labeled[mask] = labels[mask] + label_counter - 1
+        for k in range(1, n + 1):
+            center = scipy.ndimage.center_of_mass(mask, labels, k)
+            centers.append(tuple(map(int, np.round(center))))
+            values.append(val)
+            sizes.append(np.sum(labels == k))
+        label_counter += n
+    return labeled, centers, values, sizes
+
+def test_label_connected_same_values():
+    print_box('Testing function', inspect.currentframe().f_code.co_name)
+    from lognflow.plt_utils import label_connected_same_values
+    img = np.random.randint(0, 4, (60, 80))
+    labeled, centers, values, sizes = label_connected_same_values(
+        img, ignore_value = 0)
+    labeled_ref, centers_ref, values_ref, sizes_ref = \
+        _label_connected_same_values_loop(img, ignore_value = 0)
+    assert (labeled == labeled_ref).all()
+    assert (centers == np.array(centers_ref)).all()
+    assert (values == values_ref).all()
+    assert (sizes == sizes_ref).all()
+
+    img = np.random.randint(0, 20, (128, 128))
+    time_time = time.time()
+    _label_connected_same_values_loop(img)
+    print(f'labeling 128 x 128 with loops: {time.time() - time_time:.3f}s')
+    img = np.random.randint(0, 20, (1024, 1024))
+    time_time = time.time()
+    labeled, centers, values, sizes = label_connected_same_values(img)
+    print(f'labeling 1024 x 1024: {time.time() - time_time:.3f}s, '
+          f'{len(sizes)} regions')
+    assert sizes.sum() == img.size
+
 def test_plt_plot():
     print_box('Testing function', inspect.currentframe().f_code.co_name)
     y_values_list = [[1, 2, 3], [4, 5, 6]]
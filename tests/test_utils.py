@@ -5,7 +5,8 @@ import pytest
 from pathlib import Path
 import matplotlib.pyplot as plt
 import lognflow
-from lognflow.utils import printv, is_builtin_collection, print_table
+from lognflow.utils import (printv, is_builtin_collection, print_table,
+                            sort_by_time_tag)
 import numpy as np
 
 def test_is_builtin_collection():
@@ -202,6 +203,40 @@ def test_print_table_simple():
                 rows = (100 * np.random.rand(11, 10)).astype('int'), 
                 row_labels = 'auto')
 
+def test_sort_by_time_tag():
+    import time
+    n_files = 100000
+    time_tags = np.random.rand(n_files) * 1000
+    flist = [Path(f'logs/img_{_:.3f}.npy') for _ in time_tags]
+    
+    time_time = time.time()
+    flist_tags = np.array([float(fpath_v.stem.split('_')[-1]) 
+                           for fpath_v in flist])
+    sortinds = np.argsort(flist_tags)
+    flist_old = [flist[_] for _ in sortinds]
+    time_old = time.time() - time_time
+
+    time_time = time.time()
+    flist_new = sort_by_time_tag(flist)
+    time_new = time.time() - time_time
+    print(f'sorting {n_files} files, split and float: {time_old:.3f}s,'
+          f' sort_by_time_tag: {time_new:.3f}s')
+    assert [str(_) for _ in flist_new] == [str(_) for _ in flist_old]
+
+    flist.append(Path('logs/img_initial.npy'))
+    time_time = time.time()
+    flist_new = sort_by_time_tag(flist)
+    print(f'with one file with no tag: {time.time() - time_time:.3f}s')
+    assert flist_new[0].name == 'img_initial.npy'
+    assert [str(_) for _ in flist_new[1:]] == [str(_) for _ in flist_old]
+    
+    flist = [Path('logs/img_10.npy'), Path('logs/img_2.npy'),
+             Path('logs/img_1_0.5.npy'), Path('logs/img_initial.npy'),
+             Path('logs/img_0.001.npy'), Path('logs/img_2_0.5.npy')]
+    assert [_.name for _ in sort_by_time_tag(flist)] == [
+        'img_initial.npy', 'img_0.001.npy', 'img_1_0.5.npy', 
+        'img_2_0.5.npy', 'img_2.npy', 'img_10.npy']
+
 if __name__ == '__main__':
     test_print_table_simple(); exit()
     test_print_table()